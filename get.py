@@ -1,35 +1,366 @@
-import requests
+import argparse
+import asyncio
+import gzip
 import json
+import os
+import shutil
+import time
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, NamedTuple
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+BASE_URL = 'https://www.space-track.org'
+QUERY = '/basicspacedata/query/class/gp/OBJECT_TYPE/{object_type}/MEAN_MOTION/{low}--{high}/'
+MEAN_MOTION_RANGE = (12.2, 15.6) # rev/day
+OBJECT_TYPES = ('Debris',)
+CATALOG_PATH = 'data/leo_debris.json.gz'
+# space-track allows 30 requests per minute
+RATE_LIMIT = 30 # requests/min
+# re-requested before the newest local CREATION_DATE or EPOCH, since merge drops repeats
+CREATION_OVERLAP = 1 # day
+EPOCH_OVERLAP = 30 # days
+
+
+def create_session(retries: int = 5, backoff: float = 1, pool_size: int = 8) -> requests.Session:
+    """
+    Session with pooled connections that retries throttled or failed requests
+    with exponential backoff
+    """
+    session = requests.Session()
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=None,
+        respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def login(session: requests.Session, creds: dict, base_url: str = BASE_URL):
+    response = session.post(f'{base_url}/ajaxauth/login', data={'identity': creds['user'], 'password': creds['passcode']})
+    response.raise_for_status()
+
+
+def mean_motion_bands(count: int, low: float = MEAN_MOTION_RANGE[0], high: float = MEAN_MOTION_RANGE[1]) -> list[tuple[float, float]]:
+    """
+    Splits the mean motion range into count contiguous query bands
+    """
+    edges = [round(low + (high - low) * i / count, 6) for i in range(count + 1)]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def query_url(band: tuple[float, float], since: tuple[str, str] | None = None, base_url: str = BASE_URL, object_type: str = OBJECT_TYPES[0]) -> str:
+    """
+    since is a field and the value records must be after, from cutoff
+    """
+    url = base_url + QUERY.format(object_type=object_type, low=band[0], high=band[1])
+    if since is not None:
+        url += f'{since[0]}/%3E{since[1]}/'
+    return url
+
+
+def download(session: requests.Session, url: str, path: str, chunk_size: int = 1 << 16):
+    """
+    Streams a response to disk without holding it in memory
+    """
+    with session.get(url, stream=True) as response:
+        response.raise_for_status()
+        with open(path, mode='wb') as file:
+            for chunk in response.iter_content(chunk_size):
+                file.write(chunk)
+
+
+def iter_records(path: str, chunk_size: int = 1 << 16) -> Iterator[dict]:
+    """
+    Parses a JSON array of records one record at a time
+
+    Raises ValueError if the file holds an error object instead
+    """
+    decoder = json.JSONDecoder()
+    with open(path, mode='r', encoding='UTF-8') as file:
+        buffer = file.read(chunk_size).lstrip()
+        if not buffer.startswith('['):
+            buffer += file.read()
+            raise ValueError(json.loads(buffer) if buffer else 'empty response')
+        buffer = buffer[1:]
+        while True:
+            buffer = buffer.lstrip()
+            if buffer.startswith(','):
+                buffer = buffer[1:].lstrip()
+            if buffer.startswith(']'):
+                return
+            try:
+                record, end = decoder.raw_decode(buffer)
+            except json.decoder.JSONDecodeError:
+                chunk = file.read(chunk_size)
+                if not chunk:
+                    raise
+                buffer += chunk
+                continue
+            yield record
+            buffer = buffer[end:]
+
+
+def read_catalog(path: str = CATALOG_PATH) -> dict[str, dict]:
+    """
+    Local catalog keyed by NORAD_CAT_ID, empty if there is none yet
+    """
+    try:
+        with gzip.open(path, mode='rt', encoding='UTF-8') as file:
+            return {record['NORAD_CAT_ID']: record for record in json.load(file)}
+    except FileNotFoundError:
+        return {}
+
+
+def write_catalog(catalog: dict[str, dict], path: str = CATALOG_PATH):
+    """
+    Writes the catalog compressed and without whitespace, replacing the old one only once complete
+    """
+    temp = path + '.tmp'
+    with gzip.open(temp, mode='wt', encoding='UTF-8') as file:
+        json.dump(list(catalog.values()), file, separators=(',', ':'))
+    os.replace(temp, path)
+
+
+def merge(catalog: dict[str, dict], records: Iterable[dict]) -> int:
+    """
+    Keeps the record with the newest EPOCH for each NORAD_CAT_ID
+
+    Returns how many records were added or replaced
+    """
+    changed = 0
+    for record in records:
+        current = catalog.get(record['NORAD_CAT_ID'])
+        # ISO 8601 timestamps in the same format compare correctly as strings
+        if current is None or record['EPOCH'] > current['EPOCH']:
+            catalog[record['NORAD_CAT_ID']] = record
+            changed += 1
+    return changed
+
+
+def cutoff(catalog: dict[str, dict]) -> tuple[str, str] | None:
+    """
+    Field and value that every record published after the catalog was fetched is newer than
+
+    Records can be published late, with an EPOCH older than the newest local one,
+    so the cutoff is on CREATION_DATE, when the record was published.
+    Catalogs with records lacking it fall back to the newest EPOCH less EPOCH_OVERLAP,
+    which still misses records published more than that late
+    """
+    if not catalog:
+        return None
+    creation_dates = [record.get('CREATION_DATE') for record in catalog.values()]
+    if all(creation_dates):
+        field, newest, overlap = 'CREATION_DATE', max(creation_dates), CREATION_OVERLAP
+    else:
+        field, newest, overlap = 'EPOCH', max(record['EPOCH'] for record in catalog.values()), EPOCH_OVERLAP
+    return field, (datetime.fromisoformat(newest) - timedelta(days=overlap)).isoformat()
+
+
+class Partition(NamedTuple):
+    """
+    One GP query, by object type and mean motion band
+    """
+    object_type: str
+    band: tuple[float, float] # rev/day
+
+    @property
+    def name(self) -> str:
+        return f"{self.object_type.replace(' ', '_')}-{self.band[0]}-{self.band[1]}"
+
+
+def partitions(bands: int = 1, object_types: Iterable[str] = OBJECT_TYPES) -> list[Partition]:
+    return [Partition(object_type, band) for object_type in object_types for band in mean_motion_bands(bands)]
+
+
+class RateLimiter:
+    """
+    Spaces out request starts so no more than rate begin per period
+    """
+    __slots__ = 'interval', 'next_start'
+
+    def __init__(self, rate: float, period: float = 60):
+        self.interval = period / rate # s
+        self.next_start = 0 # s, monotonic
+
+    async def wait(self):
+        now = time.monotonic()
+        delay = self.next_start - now
+        self.next_start = max(now, self.next_start) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def fetch_partition(
+        session: requests.Session,
+        partition: Partition,
+        since: tuple[str, str] | None,
+        base_url: str,
+        checkpoint_dir: str,
+        semaphore: asyncio.Semaphore,
+        limiter: RateLimiter,
+        retries: int = 3,
+        backoff: float = 1
+        ) -> str:
+    """
+    Downloads one partition into checkpoint_dir and returns its path
+
+    A partition that was completed by an earlier run is not downloaded again.
+    Connection failures and truncated responses are retried with exponential backoff,
+    error objects (like being logged out) are raised straight away
+    """
+    path = os.path.join(checkpoint_dir, partition.name + '.json')
+    if os.path.exists(path):
+        return path
+    temp = path + '.part'
+    url = query_url(partition.band, since, base_url, partition.object_type)
+    for attempt in range(retries + 1):
+        try:
+            async with semaphore:
+                await limiter.wait()
+                await asyncio.to_thread(download, session, url, temp)
+            # a complete parse is what makes the checkpoint
+            await asyncio.to_thread(lambda: sum(1 for _ in iter_records(temp)))
+        except (requests.exceptions.RequestException, json.decoder.JSONDecodeError):
+            if attempt == retries:
+                raise
+            await asyncio.sleep(backoff * 2 ** attempt)
+        else:
+            os.replace(temp, path)
+            return path
+
+
+async def fetch_partitions(
+        session: requests.Session,
+        parts: list[Partition],
+        since: tuple[str, str] | None,
+        base_url: str,
+        checkpoint_dir: str,
+        concurrency: int = 4,
+        rate_limit: float = RATE_LIMIT,
+        retries: int = 3
+        ) -> list[str]:
+    """
+    Fetches partitions concurrently over the shared session
+
+    Every partition runs to completion or failure before the first failure is raised,
+    so the ones that finished stay checkpointed for the next run
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(rate_limit)
+    results = await asyncio.gather(
+        *(fetch_partition(session, part, since, base_url, checkpoint_dir, semaphore, limiter, retries) for part in parts),
+        return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+
+def prepare_checkpoints(checkpoint_dir: str, parts: list[Partition], since: tuple[str, str] | None):
+    """
+    Keeps checkpoints only if they were made for the same partitions and cutoff
+    """
+    manifest_path = os.path.join(checkpoint_dir, 'manifest.json')
+    # lists, as the manifest reads back from JSON
+    manifest = {'since': since and list(since), 'partitions': [part.name for part in parts]}
+    try:
+        with open(manifest_path, mode='r', encoding='UTF-8') as file:
+            if json.load(file) == manifest:
+                return
+    except (FileNotFoundError, json.decoder.JSONDecodeError):
+        pass
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    os.makedirs(checkpoint_dir)
+    with open(manifest_path, mode='w', encoding='UTF-8') as file:
+        json.dump(manifest, file)
+
+
+def ingest(
+        session: requests.Session,
+        path: str = CATALOG_PATH,
+        bands: int = 1,
+        full: bool = False,
+        base_url: str = BASE_URL,
+        object_types: Iterable[str] = OBJECT_TYPES,
+        concurrency: int = 4,
+        rate_limit: float = RATE_LIMIT,
+        retries: int = 3
+        ) -> tuple[int, int]:
+    """
+    Downloads every object type and mean motion band partition and merges them into the local catalog
+
+    Unless full is set, only records published since the local catalog, by cutoff, are requested.
+    Finished partitions are checkpointed next to the catalog until the merge is written,
+    so rerunning after a failure only fetches the partitions that failed.
+    The catalog being replaced, if anything changed, is kept next to it with .previous before .json.gz.
+    Returns the number of changed records and the catalog size
+    """
+    catalog = {} if full else read_catalog(path)
+    since = None if full else cutoff(catalog)
+    parts = partitions(bands, object_types)
+    checkpoint_dir = path + '.parts'
+    prepare_checkpoints(checkpoint_dir, parts, since)
+
+    paths = asyncio.run(fetch_partitions(session, parts, since, base_url, checkpoint_dir, concurrency, rate_limit, retries))
+    changed = 0
+    for part_path in paths:
+        changed += merge(catalog, iter_records(part_path))
+    # a refresh that changed nothing leaves the catalog, and the previous one, as they were
+    if changed:
+        if os.path.exists(path):
+            # the catalog being replaced, for catch.py replan to diff routes against
+            shutil.copy2(path, path.removesuffix('.json.gz') + '.previous.json.gz')
+        write_catalog(catalog, path)
+    shutil.rmtree(checkpoint_dir)
+    return changed, len(catalog)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Save current debris data from space-track.org')
+    parser.add_argument('--full', action='store_true', help='refetch everything instead of only newer records')
+    parser.add_argument('--bands', type=int, default=1, help='number of mean motion ranges to split the query into')
+    parser.add_argument('--object-types', nargs='+', default=list(OBJECT_TYPES), help='OBJECT_TYPE values, each queried separately')
+    parser.add_argument('--concurrency', type=int, default=4, help='queries in flight at once')
+    parser.add_argument('--rate-limit', type=float, default=RATE_LIMIT, help='query starts per minute')
+    parser.add_argument('--retries', type=int, default=3, help='attempts per partition after the first')
+    parser.add_argument('--base-url', default=BASE_URL, help='space-track compatible server, for testing against a local one')
+    args = parser.parse_args()
+
+    try:
+        with open('creds.txt', mode='r', encoding='UTF-8') as file:
+            creds = json.load(file)
+    except FileNotFoundError:
+        print('please create a file named creds.txt with the following format:')
+        print('{"user": "your_username_or_email", "passcode": "your_passcode"}')
+        exit(1)
+    except json.decoder.JSONDecodeError:
+        creds = {}
 
+    if not 'user' in creds or not 'passcode' in creds:
+        print('please make sure creds.txt is in the following format:')
+        print('{"user": "your_username_or_email", "passcode": "your_passcode"}')
+        exit(1)
 
-try:
-    with open('creds.txt', mode='r', encoding='UTF-8') as file:
-        creds = json.load(file)
-except FileNotFoundError:
-    print('please create a file named creds.txt with the following format:')
-    print('{"user": "your_username_or_email", "passcode": "your_passcode"}')
-    exit(1)
-except json.decoder.JSONDecodeError:
-    creds = {}
-
-if not 'user' in creds or not 'passcode' in creds:
-    print('please make sure creds.txt is in the following format:')
-    print('{"user": "your_username_or_email", "passcode": "your_passcode"}')
-    exit(1)
-
-try:
-    cookies = requests.post('https://www.space-track.org/ajaxauth/login', data={'identity': creds['user'], 'password': creds['passcode']}).cookies
-except requests.exceptions.ConnectionError:
-    print('please check your internet connection')
-    exit(1)
-except requests.exceptions.HTTPError:
-    print('please check your credentials')
-    exit(1)
-
-js: dict | list | str | int | float | bool | None = json.loads(requests.get('https://www.space-track.org/basicspacedata/query/class/gp/OBJECT_TYPE/Debris/MEAN_MOTION/12.2--15.6/', cookies=cookies).text)
-if 'error' in js:
-    print('please ensure your credentials are correct')
-    exit(2)
-
-with open('data/leo_debris.json', mode='w', encoding='UTF-8') as file:
-    json.dump(js, file, indent=4)
+    session = create_session(pool_size=args.concurrency)
+    try:
+        login(session, creds, args.base_url)
+        changed, total = ingest(
+            session, bands=args.bands, full=args.full, base_url=args.base_url, object_types=args.object_types,
+            concurrency=args.concurrency, rate_limit=args.rate_limit, retries=args.retries)
+    except requests.exceptions.ConnectionError:
+        print('please check your internet connection')
+        exit(1)
+    except requests.exceptions.HTTPError:
+        print('please check your credentials')
+        exit(1)
+    except ValueError:
+        print('please ensure your credentials are correct')
+        exit(2)
+    print(f'{changed} records updated, {total} in {CATALOG_PATH}')
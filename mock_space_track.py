@@ -0,0 +1,109 @@
+"""
+Local stand-in for the space-track.org endpoints used by get.py
+
+Serves the records of a JSON (or .json.gz) catalog file:
+  py mock_space_track.py data/leo_debris.json.gz 8000
+  py get.py --base-url http://localhost:8000
+"""
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+
+COOKIE = 'chocolatechip=mock'
+
+
+def load_records(path: str) -> list[dict]:
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, mode='rt', encoding='UTF-8') as file:
+        return json.load(file)
+
+
+def query(records: list[dict], path: str) -> list[dict] | None:
+    """
+    Filters records by a /basicspacedata/query/class/gp/... path
+
+    Supports the FIELD/value (case insensitive), FIELD/low--high and FIELD/>value
+    predicates, returns None for paths it does not understand
+    """
+    parts = [unquote(part) for part in path.strip('/').split('/')]
+    if parts[:4] != ['basicspacedata', 'query', 'class', 'gp'] or len(parts) % 2:
+        return None
+    result = records
+    for field, value in zip(parts[4::2], parts[5::2]):
+        if '--' in value:
+            low, high = map(float, value.split('--'))
+            result = [record for record in result if low <= float(record[field]) <= high]
+        elif value.startswith('>'):
+            result = [record for record in result if record[field] > value[1:]]
+        else:
+            result = [record for record in result if str(record.get(field)).lower() == value.lower()]
+    return result
+
+
+class Handler(BaseHTTPRequestHandler):
+    records: list[dict] = []
+    request_count = 0 # for checking retries and partitioning
+    faults = 0 # queries still to be cut off halfway, for exercising retries
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, value, status: int = 200, headers: dict | None = None, truncate: bool = False):
+        body = json.dumps(value).encode('UTF-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if not truncate:
+            self.send_header('Content-Length', str(len(body)))
+        for name, header in (headers or {}).items():
+            self.send_header(name, header)
+        self.end_headers()
+        if truncate:
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def do_POST(self):
+        type(self).request_count += 1
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path != '/ajaxauth/login':
+            return self.send_json({'error': 'not found'}, 404)
+        self.send_json('', headers={'Set-Cookie': COOKIE + '; Path=/'})
+
+    def do_GET(self):
+        type(self).request_count += 1
+        if COOKIE not in self.headers.get('Cookie', ''):
+            return self.send_json({'error': 'You must be logged in to complete this action'})
+        result = query(self.records, self.path)
+        if result is None:
+            return self.send_json({'error': 'not found'}, 404)
+        with self.lock:
+            truncate = type(self).faults > 0
+            type(self).faults -= truncate
+        self.send_json(result, truncate=truncate)
+
+
+def serve(records: list[dict], port: int = 0, faults: int = 0) -> ThreadingHTTPServer:
+    """
+    Starts a server on a background thread, port 0 picks a free port
+
+    The first faults queries get a truncated response
+    """
+    handler = type('Handler', (Handler,), {'records': records, 'faults': faults, 'lock': threading.Lock()})
+    server = ThreadingHTTPServer(('localhost', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) < 2:
+        print('Usage: py', sys.argv[0], 'catalog.json [port] [faults]')
+        exit(1)
+    server = serve(load_records(sys.argv[1]), int(sys.argv[2]) if len(sys.argv) > 2 else 8000, int(sys.argv[3]) if len(sys.argv) > 3 else 0)
+    print(f'serving on http://localhost:{server.server_address[1]}')
+    threading.Event().wait()
@@ -0,0 +1,112 @@
+import time
+from typing import NamedTuple
+import numpy as np
+import lib
+import catch
+from candidates import CandidateIndex
+from catalog import Catalog
+
+
+class Route(NamedTuple):
+    positions: tuple[int, ...] # catalog positions, starting object first
+    dv: float # m/s
+    time: float # s
+    legs: tuple[tuple[float, float, int], ...] # (dv, dt, position) per catch
+
+
+def score(route: Route, objects: Catalog, objective: str = 'dv') -> float:
+    """
+    Objects caught per m/s (including deorbit) or per year, higher is better
+    """
+    caught = len(route.positions) - 1
+    if not caught:
+        return 0
+    if objective == 'dv':
+        return caught / (route.dv + catch.deorbit_dv(lib.Orbit2d.from_dict(objects[route.positions[-1]])))
+    if objective == 'time':
+        return caught / (route.time / 60 / 60 / 24 / 365)
+    raise KeyError(objective)
+
+
+def beam_search(
+        objects: Catalog,
+        start: int,
+        per_catch_fuel_budget: float,
+        per_catch_time_target: float,
+        total_fuel_budget: float,
+        beam_width: int = 8,
+        branching: int = 4,
+        depth: int | None = None,
+        time_limit: float = 10, # s
+        objective: str = 'dv',
+        index: CandidateIndex | None = None,
+        cache: catch.TransferCache | None = None
+        ) -> tuple[list[dict], float, float, list[tuple[float, float, int]]]:
+    """
+    Beam search alternative to collect
+
+    Each step expands every route in the beam with its branching cheapest
+    (objective='dv') or fastest (objective='time') feasible next catches.
+    Unlike collect, total_fuel_budget is a hard limit: next catches whose
+    inclination change alone would exceed the remaining budget are never
+    evaluated, and routes that cannot extend are set aside as finished.
+    Among routes that end at the same object after the same number of
+    catches, ones with both more dv and more time are dropped.
+
+    Stops after depth catches, when no route can extend or after time_limit,
+    and returns the best route found, in the same form as collect
+    """
+    if objective not in ('dv', 'time'):
+        raise KeyError(objective)
+    deadline = time.monotonic() + time_limit
+    if index is None:
+        index = CandidateIndex(objects)
+    if cache is None:
+        cache = catch.TransferCache(objects)
+    index.caught.clear()
+    ids = objects['NORAD_CAT_ID']
+    rank_by = 0 if objective == 'dv' else 1
+
+    beam = [Route((start,), 0, 0, ())]
+    finished = []
+    step = 0
+    while beam and (depth is None or step < depth) and time.monotonic() < deadline:
+        step += 1
+        children = []
+        for route in beam:
+            current = objects[route.positions[-1]]
+            remaining = total_fuel_budget - route.dv
+            candidates = index.candidates(current, start, min(per_catch_fuel_budget, remaining))
+            candidates = candidates[~np.isin(ids[candidates], ids[list(route.positions)])]
+
+            dv, dt, valid = cache.get(current, candidates, per_catch_fuel_budget).evaluate(route.time)
+            feasible = np.flatnonzero(valid & (dt < per_catch_time_target) & (dv <= remaining))
+            if not len(feasible):
+                finished.append(route)
+                continue
+            if len(feasible) > branching:
+                feasible = feasible[np.argpartition((dv, dt)[rank_by][feasible], branching)[:branching]]
+            for choice in feasible:
+                position = int(candidates[choice])
+                children.append(Route(
+                    route.positions + (position,),
+                    route.dv + float(dv[choice]),
+                    route.time + float(dt[choice]),
+                    route.legs + ((float(dv[choice]), float(dt[choice]), position),)))
+
+        # dominance: same last object and catch count, no cheaper and no faster
+        children.sort(key=lambda route: (route.positions[-1], route.dv, route.time))
+        kept = []
+        for route in children:
+            if kept and kept[-1].positions[-1] == route.positions[-1] and kept[-1].time <= route.time:
+                continue
+            kept.append(route)
+        kept.sort(key=lambda route: (route.dv, route.time)[rank_by])
+        beam = kept[:beam_width]
+
+    best = max(finished + beam, key=lambda route: score(route, objects, objective))
+    return (
+        [objects[position] for position in best.positions],
+        best.dv,
+        best.time,
+        list(best.legs))
@@ -0,0 +1,177 @@
+"""
+Benchmarks for the planner hot paths on synthetic catalogs
+
+  py benchmark.py [--sizes 1000 10000 100000] [--save-baseline] [--tolerance 0.25]
+
+Results go to ../bench/results.json and are compared against
+../bench/baseline.json, exiting with 1 if anything got slower than tolerance
+"""
+import argparse
+import json
+import os
+import platform
+import time
+import tracemalloc
+from typing import Callable
+import lib
+import catch
+import pareto
+import phasing
+import synthetic
+from candidates import CandidateIndex
+from catalog import Catalog
+from catch import PER_CATCH_FUEL_BUDGET, PER_CATCH_TIME_BUDGET, TOTAL_FUEL_BUDGET
+
+
+RESULTS_PATH = '../bench/results.json'
+BASELINE_PATH = '../bench/baseline.json'
+
+# per-object scalar loops are capped so the largest sizes stay quick
+SCALAR_LIMIT = 5_000
+
+
+def measure(name: str, size: int, function: Callable[[], object], count: int, repeat: int = 3) -> dict:
+    """
+    Best of repeat timings, then one more run under tracemalloc for peak memory
+    """
+    seconds = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds = min(seconds, time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'name': name,
+        'size': size,
+        'count': count,
+        'seconds': seconds,
+        'throughput': count / seconds if seconds else float('inf'), # per s
+        'peak_bytes': peak,
+    }
+
+
+def benchmarks(size: int, seed: int = 0) -> list[dict]:
+    records = synthetic.generate(size, seed)
+    catalog = Catalog.from_objects(records)
+    objects = catch.planning_objects(catalog)
+    scalar = records[:SCALAR_LIMIT]
+    orbits = [lib.Orbit2d.from_dict(record) for record in scalar]
+    frozen_orbits = [lib.FrozenOrbit2d.from_dict(record) for record in scalar]
+    inclinations = [float(record['INCLINATION']) for record in scalar]
+    orbit_array = catalog.orbits
+    batch_dv, batch_dt, batch_valid = catch.resources_to_transfer_batch(records[0], catalog, 0, PER_CATCH_FUEL_BUDGET)
+
+    def orbit_properties(orbits):
+        for orbit in orbits:
+            orbit.periapsis_velocity, orbit.apoapsis_velocity, orbit.period, orbit.semiminor_axis
+
+    results = [
+        measure('Catalog.from_objects', size, lambda: Catalog.from_objects(records), size),
+        measure('Orbit2d.from_dict', size, lambda: [lib.Orbit2d.from_dict(record) for record in scalar], len(scalar)),
+        measure('Orbit2d properties', size, lambda: orbit_properties(orbits), len(scalar)),
+        measure('FrozenOrbit2d properties', size, lambda: orbit_properties(frozen_orbits), len(scalar)),
+        measure('OrbitArray properties', size, lambda: (orbit_array.periapsis_velocity, orbit_array.apoapsis_velocity, orbit_array.period, orbit_array.semiminor_axis), size),
+        measure('nodal_precession', size, lambda: [lib.nodal_precession(inc, orbit) for inc, orbit in zip(inclinations, orbits)], len(scalar)),
+        measure('nodal_precession OrbitArray', size, lambda: lib.nodal_precession(catalog['INCLINATION'], orbit_array), size),
+        measure('coaxial_elliptic_orbit_change_dv', size, lambda: [lib.coaxial_elliptic_orbit_change_dv(orbits[0], orbit) for orbit in orbits], len(scalar)),
+        measure('coaxial_elliptic_orbit_change_dv OrbitArray', size, lambda: lib.coaxial_elliptic_orbit_change_dv(orbits[0], orbit_array), size),
+        measure('resources_to_transfer', size, lambda: [_scalar_transfer(scalar[0], record) for record in scalar], len(scalar)),
+        measure('resources_to_transfer_batch', size, lambda: catch.resources_to_transfer_batch(records[0], catalog, 0, PER_CATCH_FUEL_BUDGET), size),
+        measure('pareto_front', size, lambda: pareto.pareto_front(batch_dv, batch_dt), size),
+        measure('phasing.improve', size, lambda: phasing.improve(records[0], catalog, 0, PER_CATCH_FUEL_BUDGET, batch_dv, batch_dt, batch_valid), size),
+    ]
+    start = route_start(objects)
+    if start is not None:
+        caught, _, _, _ = catch.collect(objects, start, PER_CATCH_FUEL_BUDGET, PER_CATCH_TIME_BUDGET, TOTAL_FUEL_BUDGET)
+        assert len(caught) > 1, f'start {start} catches nothing'
+        results += [
+            measure('collect_one', size, lambda: _collect_one(objects, start, None), 1),
+            measure('collect_one indexed', size, lambda: _collect_one(objects, start, CandidateIndex(objects)), 1),
+            measure('analyze_next_catch', size, lambda: catch.analyze_next_catch(objects, [objects[start]], start, PER_CATCH_FUEL_BUDGET, PER_CATCH_TIME_BUDGET), 1),
+            measure('collect', size, lambda: catch.collect(objects, start, PER_CATCH_FUEL_BUDGET, PER_CATCH_TIME_BUDGET, TOTAL_FUEL_BUDGET), 1),
+            measure('collect optimize_phasing', size, lambda: catch.collect(objects, start, PER_CATCH_FUEL_BUDGET, PER_CATCH_TIME_BUDGET, TOTAL_FUEL_BUDGET, optimize_phasing=True), 1),
+        ]
+    return results
+
+
+def route_start(objects: Catalog) -> int | None:
+    """
+    First start position collect catches something from, None if there is none
+
+    Low inclination starts often have nothing within the budget,
+    and timing those would only measure an empty search
+    """
+    index = CandidateIndex(objects)
+    for start in range(len(objects) - 1):
+        if _collect_one(objects, start, index) is not None:
+            return start
+    return None
+
+
+def _collect_one(objects: Catalog, start: int, index: CandidateIndex | None):
+    try:
+        return catch.collect_one(objects, [objects[start]], start, PER_CATCH_FUEL_BUDGET, PER_CATCH_TIME_BUDGET, 0, catalog=objects, index=index)
+    except ValueError:
+        return None
+
+
+def _scalar_transfer(object_1: dict, object_2: dict):
+    try:
+        return catch.resources_to_transfer(object_1, object_2, 0, PER_CATCH_FUEL_BUDGET)
+    except ZeroDivisionError:
+        return None
+
+
+def compare(results: list[dict], baseline: list[dict], tolerance: float) -> list[tuple[dict, float]]:
+    """
+    Results slower than their baseline by more than tolerance, with the time ratio
+    """
+    previous = {(result['name'], result['size']): result for result in baseline}
+    regressions = []
+    for result in results:
+        base = previous.get((result['name'], result['size']))
+        if base is None:
+            continue
+        ratio = result['seconds'] / base['seconds']
+        if ratio > 1 + tolerance:
+            regressions.append((result, ratio))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the planner hot paths')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown against the baseline')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the new baseline')
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        for result in benchmarks(size, args.seed):
+            results.append(result)
+            print(f"{result['name']:45} {size:7}: {result['seconds'] * 1000:10.2f} ms, {result['throughput']:12.0f}/s, {result['peak_bytes'] / 2**20:8.2f} MiB")
+
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    report = {'python': platform.python_version(), 'machine': platform.machine(), 'seed': args.seed, 'results': results}
+    with open(RESULTS_PATH, mode='w', encoding='UTF-8') as f:
+        json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(BASELINE_PATH, mode='w', encoding='UTF-8') as f:
+            json.dump(report, f, indent=2)
+        exit(0)
+
+    try:
+        with open(BASELINE_PATH, mode='r', encoding='UTF-8') as f:
+            baseline = json.load(f)['results']
+    except FileNotFoundError:
+        print('no baseline yet, run with --save-baseline to create one')
+        exit(0)
+    regressions = compare(results, baseline, args.tolerance)
+    for result, ratio in regressions:
+        print(f"regression: {result['name']} ({result['size']}) is {ratio:.2f}x slower than baseline")
+    exit(1 if regressions else 0)
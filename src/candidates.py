@@ -0,0 +1,69 @@
+import math
+import numpy as np
+import lib
+from catalog import Catalog
+
+
+class CandidateIndex:
+    """
+    Persistent index over a catalog for pruning next-catch searches
+
+    Holds the positions sorted by inclination for range queries
+    and the NORAD IDs caught so far. RAAN is not indexed, differences in it
+    are waited out by precession rather than paid for in dv
+    """
+    __slots__ = 'catalog', 'order', 'inclinations', 'caught', 'highest_apoapsis'
+
+    def __init__(self, catalog: Catalog):
+        self.catalog = catalog
+        self.order = np.argsort(catalog['INCLINATION'], kind='stable')
+        self.inclinations = np.ascontiguousarray(catalog['INCLINATION'][self.order])
+        self.caught: set[int] = set()
+        self.highest_apoapsis = float(catalog.orbits.apoapsis.max()) if len(catalog) else 0 # m
+
+    def __contains__(self, norad_cat_id: int) -> bool:
+        return norad_cat_id in self.caught
+
+    def mark_caught(self, norad_cat_id: int):
+        self.caught.add(norad_cat_id)
+
+    def inclination_window(self, current: dict, per_catch_fuel_budget: float) -> float: # deg
+        """
+        Largest inclination change whose lower-bound dv fits the budget
+
+        Every orbit the transfer can change inclination at has its periapsis
+        at or below the highest apoapsis involved, so its periapsis velocity
+        is at least the circular velocity there
+        """
+        radius = max(self.highest_apoapsis, lib.Orbit2d.from_dict(current).apoapsis)
+        slowest = lib.Orbit2d(radius).periapsis_velocity
+        ratio = per_catch_fuel_budget / (2 * slowest)
+        if ratio >= 1:
+            return 180
+        return 2 * math.degrees(math.asin(ratio))
+
+    def inclination_range(self, low: float, high: float) -> np.ndarray:
+        """
+        Positions with low <= inclination <= high, in catalog order
+        """
+        start = np.searchsorted(self.inclinations, low, side='left')
+        stop = np.searchsorted(self.inclinations, high, side='right')
+        return np.sort(self.order[start:stop])
+
+    def candidates(
+            self,
+            current: dict,
+            start: int,
+            per_catch_fuel_budget: float
+            ) -> np.ndarray:
+        """
+        Positions after start that are not caught
+        and whose inclination change alone fits the budget
+        """
+        inclination = float(current['INCLINATION'])
+        window = self.inclination_window(current, per_catch_fuel_budget)
+        positions = self.inclination_range(inclination - window, inclination + window)
+        positions = positions[positions > start]
+        if self.caught:
+            positions = positions[~np.isin(self.catalog['NORAD_CAT_ID'][positions], list(self.caught))]
+        return positions
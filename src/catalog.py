@@ -0,0 +1,161 @@
+from typing import Self
+import gzip
+import hashlib
+import json
+import os
+import numpy as np
+import lib
+
+
+# fields the planner reads from space-track GP records, and their column types
+FIELDS: dict[str, np.dtype] = {
+    'NORAD_CAT_ID': np.dtype(np.int64),
+    'EPOCH': np.dtype('datetime64[us]'),
+    'MEAN_MOTION': np.dtype(np.float64), # rev/day
+    'ECCENTRICITY': np.dtype(np.float64), # unitless
+    'INCLINATION': np.dtype(np.float64), # deg
+    'RA_OF_ASC_NODE': np.dtype(np.float64), # deg
+    'ARG_OF_PERICENTER': np.dtype(np.float64), # deg
+    'MEAN_ANOMALY': np.dtype(np.float64), # deg
+    'SEMIMAJOR_AXIS': np.dtype(np.float64), # km
+    'APOAPSIS': np.dtype(np.float64), # km altitude
+    'PERIAPSIS': np.dtype(np.float64), # km altitude
+}
+
+
+def _parse(value, dtype: np.dtype):
+    if value is None:
+        return -1 if dtype.kind == 'i' else 'NaT' if dtype.kind == 'M' else float('nan')
+    if dtype.kind == 'M':
+        return value
+    return dtype.type(value)
+
+
+class Catalog:
+    """
+    Columnar view of a debris catalog
+
+    Indexing with a field name returns that column,
+    with an integer returns the record as a dict (usable wherever a
+    space-track dict is expected), and with a slice, mask or index array
+    returns the matching sub-catalog
+    """
+    __slots__ = 'columns', '_orbits'
+
+    def __init__(self, columns: dict[str, np.ndarray]):
+        self.columns = columns
+        self._orbits = None
+
+    def __repr__(self):
+        return f"Catalog({len(self)} objects)"
+
+    def __len__(self) -> int:
+        return len(self.columns['NORAD_CAT_ID'])
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.columns[key]
+        if isinstance(key, (int, np.integer)):
+            return self.record(key)
+        return type(self)({field: column[key] for field, column in self.columns.items()})
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.record(index)
+
+    @classmethod
+    def from_objects(cls, objects: list[dict]) -> Self:
+        return cls({
+            field: np.array([_parse(obj.get(field), dtype) for obj in objects], dtype=dtype)
+            for field, dtype in FIELDS.items()})
+
+    def record(self, index: int) -> dict:
+        record = {}
+        for field, column in self.columns.items():
+            value = column[index]
+            record[field] = str(value) if column.dtype.kind == 'M' else value.item()
+        return record
+
+    @property
+    def orbits(self) -> lib.OrbitArray:
+        if self._orbits is None:
+            self._orbits = lib.OrbitArray(self.columns['SEMIMAJOR_AXIS'] * 1000, self.columns['ECCENTRICITY'])
+        return self._orbits
+
+    def digest(self) -> str:
+        """
+        sha256 of the columns, so equal content hashes the same however it was loaded
+        """
+        digest = hashlib.sha256()
+        for field, column in sorted(self.columns.items()):
+            digest.update(f'{field}:{column.dtype.str}:'.encode('UTF-8'))
+            digest.update(np.ascontiguousarray(column).tobytes())
+        return digest.hexdigest()
+
+    def sorted(self, *keys: str) -> Self:
+        """
+        Stable sort by the given fields, first key most significant
+        """
+        return self[np.lexsort([self.columns[key] for key in reversed(keys)])]
+
+
+def load(path: str) -> Catalog:
+    """
+    Loads a space-track JSON (or gzipped JSON) catalog through its compiled column cache
+
+    The cache is a directory of memory-mapped .npy columns next to the JSON,
+    rebuilt when the source's size or mtime change and its hash no longer matches
+    """
+    cache_dir = path.removesuffix('.gz').removesuffix('.json') + '.catalog'
+    source = _read_source(cache_dir)
+    stat = os.stat(path)
+    if source is None or (source['size'], source['mtime_ns']) != (stat.st_size, stat.st_mtime_ns):
+        digest = file_hash(path)
+        if source is None or source['sha256'] != digest:
+            compile_catalog(path, cache_dir)
+        _write_source(cache_dir, {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest})
+    return Catalog({field: np.load(os.path.join(cache_dir, field + '.npy'), mmap_mode='r') for field in FIELDS})
+
+
+def compile_catalog(path: str, cache_dir: str) -> Catalog:
+    """
+    Parses the JSON once and writes one .npy file per field
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, mode='rt', encoding='UTF-8') as f:
+        catalog = Catalog.from_objects(json.load(f))
+    os.makedirs(cache_dir, exist_ok=True)
+    # the source file marks a complete cache, so drop it while columns change
+    try:
+        os.remove(os.path.join(cache_dir, 'source.json'))
+    except FileNotFoundError:
+        pass
+    for field in FIELDS:
+        np.save(os.path.join(cache_dir, field + '.npy'), catalog[field])
+    return catalog
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, mode='rb') as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_source(cache_dir: str) -> dict | None:
+    try:
+        with open(os.path.join(cache_dir, 'source.json'), mode='r', encoding='UTF-8') as f:
+            source = json.load(f)
+    except (FileNotFoundError, json.decoder.JSONDecodeError):
+        return None
+    if not all(os.path.exists(os.path.join(cache_dir, field + '.npy')) for field in FIELDS):
+        return None
+    return source
+
+
+def _write_source(cache_dir: str, source: dict):
+    temp = os.path.join(cache_dir, 'source.json.tmp')
+    with open(temp, mode='w', encoding='UTF-8') as f:
+        json.dump(source, f)
+    os.replace(temp, os.path.join(cache_dir, 'source.json'))
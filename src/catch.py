@@ -1,8 +1,15 @@
+from collections import OrderedDict
 from functools import partial
-from io import StringIO
+from typing import NamedTuple, Self
+import numpy as np
 import lib
 import math
 import constants
+import instrument
+import pareto
+import phasing
+from candidates import CandidateIndex
+from catalog import Catalog, load as load_catalog
 
 
 
@@ -13,15 +20,17 @@ def resources_to_transfer(
         extra_budget: float = 0,
         debug_log = None
         ) -> tuple[float, float]:
-    if debug_log is None:
-        debug_log = StringIO()
+    """
+    dv and time to get from object_1 to object_2
 
+    A human readable breakdown is printed to debug_log if one is given,
+    and a transfer event is recorded while tracing
+    """
     # set up orbits
-    orbit_1 = lib.Orbit2d.from_dict(object_1)
-    orbit_2 = lib.Orbit2d.from_dict(object_2)
+    orbit_1 = lib.FrozenOrbit2d.from_dict(object_1)
+    orbit_2 = lib.FrozenOrbit2d.from_dict(object_2)
     orbit_i = find_intermediate_orbit(orbit_1, orbit_2)
     orbit_j = find_extra_budget_orbit(extra_budget, orbit_1, orbit_2)
-    print(f'Changing from {orbit_1.semimajor_axis/1000:.0f} km to {orbit_2.semimajor_axis/1000:.0f} km', file=debug_log)
 
     inc_1 = float(object_1['INCLINATION'])
     inc_2 = float(object_2['INCLINATION'])
@@ -35,29 +44,20 @@ def resources_to_transfer(
     RAAN_delta = RAAN_1 - RAAN_2
     if RAAN_delta < 0:
         RAAN_delta += 360
-    print(f'initial RAAN: {RAAN_1}, target RAAN: {RAAN_2}, delta: {RAAN_delta}', file=debug_log)
 
     time_to_precess_to_2 = partial(match_RAAN, target_precession_rate=nodal_precession_2, RAAN_delta=RAAN_delta)
 
-    j_precession_time = time_to_precess_to_2(orbit_j, inc_2)
-
-    min_time_to_precess, period = min(
+    precess_options = [
         (time_to_precess_to_2(orbit_1, inc_1), orbit_1.period),
         (time_to_precess_to_2(orbit_i, inc_2), orbit_i.period),
-        (j_precession_time, orbit_j.period),
-        key=lambda x: x[0])
-
-    # == comaprison is ok because min returns the same object
-    if period == orbit_1.period:
-        print(f'match RAAN at 1, {min_time_to_precess:.0f} s', file=debug_log)
-    if period == orbit_i.period:
-        print(f'match RAAN at i, {min_time_to_precess:.0f} s', file=debug_log)
-    if period == orbit_j.period:
-        print(f'match RAAN at j, {min_time_to_precess:.0f} s', file=debug_log)
+        (time_to_precess_to_2(orbit_j, inc_2), orbit_j.period)]
+    # min keeps the first option on ties
+    raan_site = min(range(len(precess_options)), key=lambda option: precess_options[option][0])
+    min_time_to_precess, period = precess_options[raan_site]
 
     orbits_to_precess = min_time_to_precess / period
 
-    j_used = min_time_to_precess is j_precession_time
+    j_used = raan_site == 2
     j_change_dv_total = extra_budget if j_used else 0
 
     # Calculate cheapest place to match inclination
@@ -70,40 +70,263 @@ def resources_to_transfer(
     if j_used:
         inc_change_opportunities.append(necessary_inc_change_dv(orbit_j))
     inc_change_dv = min(inc_change_opportunities)
-
-    print(f'inc change from {inc_1} to {inc_2} (delta {inc_delta}) requires {inc_change_dv} m/s', file=debug_log)
-    print(f'change inc at {["1", "2", "i", "j"][inc_change_opportunities.index(inc_change_dv)]}', file=debug_log)
+    inc_site = inc_change_opportunities.index(inc_change_dv)
 
     # Calculate time to match mean anomaly
     orbits_to_match_mean_anomaly = match_mean_anomaly(orbit_2, period, orbits_to_precess)
-    print(f'time to match mean anomaly: {orbits_to_match_mean_anomaly * period} s', file=debug_log)
 
     # Calculate hohmann delta v
     orbit_1_to_i = lib.coaxial_elliptic_orbit_change_dv(orbit_1, orbit_i)
     orbit_i_to_2 = lib.coaxial_elliptic_orbit_change_dv(orbit_i, orbit_2)
-    print(f'orbit_1: {orbit_1.semimajor_axis/1000:.0f} km', file=debug_log)
-    if j_used:
-        print(f'orbit_j: {orbit_j.semimajor_axis/1000:.0f} km (1 to j to 1: {extra_budget:.2f} m/s)', file=debug_log)
-    print(f'orbit_i: {orbit_i.semimajor_axis/1000:.0f} km (1 to i: {orbit_1_to_i:.2f} m/s)', file=debug_log)
-    print(f'orbit_2: {orbit_2.semimajor_axis/1000:.0f} km (i to 2: {orbit_i_to_2:.2f} m/s)', file=debug_log)
-
 
     total_dv = orbit_1_to_i + orbit_i_to_2 + inc_change_dv + j_change_dv_total
     total_time = orbits_to_precess * period + orbits_to_match_mean_anomaly * orbit_2.period
-    return total_dv, total_time, debug_log
+
+    if debug_log is not None:
+        print(f'Changing from {orbit_1.semimajor_axis/1000:.0f} km to {orbit_2.semimajor_axis/1000:.0f} km', file=debug_log)
+        print(f'initial RAAN: {RAAN_1}, target RAAN: {RAAN_2}, delta: {RAAN_delta}', file=debug_log)
+        print(f'match RAAN at {["1", "i", "j"][raan_site]}, {min_time_to_precess:.0f} s', file=debug_log)
+        print(f'inc change from {inc_1} to {inc_2} (delta {inc_delta}) requires {inc_change_dv} m/s', file=debug_log)
+        print(f'change inc at {["1", "2", "i", "j"][inc_site]}', file=debug_log)
+        print(f'time to match mean anomaly: {orbits_to_match_mean_anomaly * period} s', file=debug_log)
+        print(f'orbit_1: {orbit_1.semimajor_axis/1000:.0f} km', file=debug_log)
+        if j_used:
+            print(f'orbit_j: {orbit_j.semimajor_axis/1000:.0f} km (1 to j to 1: {extra_budget:.2f} m/s)', file=debug_log)
+        print(f'orbit_i: {orbit_i.semimajor_axis/1000:.0f} km (1 to i: {orbit_1_to_i:.2f} m/s)', file=debug_log)
+        print(f'orbit_2: {orbit_2.semimajor_axis/1000:.0f} km (i to 2: {orbit_i_to_2:.2f} m/s)', file=debug_log)
+
+    if instrument.tracer:
+        instrument.tracer.event(
+            'transfer',
+            from_id=int(object_1['NORAD_CAT_ID']),
+            to_id=int(object_2['NORAD_CAT_ID']),
+            time_offset=time_offset,
+            raan_site=['1', 'i', 'j'][raan_site],
+            raan_semimajor_axis=[orbit_1, orbit_i, orbit_j][raan_site].semimajor_axis,
+            precess_time=min_time_to_precess,
+            inc_site=['1', '2', 'i', 'j'][inc_site],
+            inc_change_dv=inc_change_dv,
+            orbit_1_to_i_dv=orbit_1_to_i,
+            orbit_i_to_2_dv=orbit_i_to_2,
+            extra_budget_dv=j_change_dv_total,
+            mean_anomaly_time=orbits_to_match_mean_anomaly * orbit_2.period,
+            dv=total_dv,
+            dt=total_time)
+    return total_dv, total_time
+
+
+def resources_to_transfer_batch(
+        object_1: dict,
+        candidates: Catalog,
+        time_offset: float = 0,
+        extra_budget: float = 0,
+        ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Vectorized resources_to_transfer from one object to every candidate
+
+    Degenerate transfers (the ones the scalar path raises
+    ZeroDivisionError for) are masked out instead of raising.
+    Returns dv and dt arrays and the mask of valid entries
+    """
+    return transfer_batch(
+        lib.OrbitArray.from_dicts([object_1]),
+        float(object_1['INCLINATION']),
+        float(object_1['RA_OF_ASC_NODE']),
+        candidates.orbits,
+        candidates['INCLINATION'],
+        candidates['RA_OF_ASC_NODE'],
+        time_offset,
+        extra_budget)
+
+
+def transfer_batch(
+        orbit_1: lib.OrbitArray,
+        inc_1: np.ndarray,
+        raan_1: np.ndarray,
+        orbit_2: lib.OrbitArray,
+        inc_2: np.ndarray,
+        raan_2: np.ndarray,
+        time_offset: float | np.ndarray = 0,
+        extra_budget: float = 0,
+        ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Array kernel behind resources_to_transfer_batch
+
+    All arguments broadcast against each other,
+    so either side of the transfer can be one object or many
+    """
+    return transfer_invariants(orbit_1, inc_1, raan_1, orbit_2, inc_2, raan_2, extra_budget).evaluate(time_offset)
+
+
+class TransferInvariants:
+    """
+    Parts of resources_to_transfer that do not depend on time_offset
+
+    The three RAAN matching options (at 1, i and j) are stacked
+    along the first axis of rates and periods
+    """
+    __slots__ = (
+        'extra_budget', 'raan_1', 'rate_1', 'raan_2', 'rate_2', 'period_2',
+        'rates', 'periods', 'inc_change_dv', 'inc_change_dv_j', 'hohmann_dv')
+
+    def __init__(self, extra_budget: float, **arrays: np.ndarray):
+        self.extra_budget = extra_budget # m/s
+        for name, array in arrays.items():
+            setattr(self, name, array)
+
+    @classmethod
+    def empty(cls, size: int, extra_budget: float) -> Self:
+        return cls(extra_budget, **{
+            name: np.empty((3, size) if name in ('rates', 'periods') else size)
+            for name in cls.__slots__[1:]})
+
+    def take(self, positions: np.ndarray) -> Self:
+        return type(self)(self.extra_budget, **{name: getattr(self, name)[..., positions] for name in self.__slots__[1:]})
+
+    def put(self, positions: np.ndarray, other: Self):
+        for name in self.__slots__[1:]:
+            getattr(self, name)[..., positions] = getattr(other, name)
+
+    def evaluate(self, time_offset: float | np.ndarray = 0) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns dv, dt and the valid mask at time_offset
+
+        Only the RAAN phase moves with time,
+        time_offset can be an array shaped to broadcast against the pairs
+        """
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            RAAN_1 = (self.raan_1 + self.rate_1 * time_offset) % 360
+            RAAN_2 = (self.raan_2 + self.rate_2 * time_offset) % 360
+            RAAN_delta = RAAN_1 - RAAN_2
+            RAAN_delta = np.where(RAAN_delta < 0, RAAN_delta + 360, RAAN_delta)
+
+            # stacked options go in front of any time axes
+            options = (3,) + (1,) * (RAAN_delta.ndim - 1) + self.rates.shape[1:]
+            precession_rate_delta = self.rate_2 - self.rates.reshape(options)
+            precess_times = np.where(
+                precession_rate_delta != 0,
+                np.where(precession_rate_delta < 0, RAAN_delta - 360, RAAN_delta) / precession_rate_delta,
+                np.inf)
+
+            # same candidate order as the scalar min, argmin keeps the first on ties
+            choice = np.argmin(precess_times, axis=0)[np.newaxis]
+            min_time_to_precess = np.take_along_axis(precess_times, choice, axis=0)[0]
+            period = np.take_along_axis(np.broadcast_to(self.periods.reshape(options), precess_times.shape), choice, axis=0)[0]
+            j_used = choice[0] == 2
+
+            orbits_to_precess = min_time_to_precess / period
+            orbits_to_match_mean_anomaly = np.abs(1 / ((period - self.period_2) / self.period_2))
+
+            total_dv = self.hohmann_dv + np.where(j_used, self.inc_change_dv_j, self.inc_change_dv) + np.where(j_used, self.extra_budget, 0)
+            total_time = orbits_to_precess * period + orbits_to_match_mean_anomaly * self.period_2
+        return total_dv, total_time, np.isfinite(total_dv) & np.isfinite(total_time)
+
+
+def transfer_invariants(
+        orbit_1: lib.OrbitArray,
+        inc_1: np.ndarray,
+        raan_1: np.ndarray,
+        orbit_2: lib.OrbitArray,
+        inc_2: np.ndarray,
+        raan_2: np.ndarray,
+        extra_budget: float = 0,
+        ) -> TransferInvariants:
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        orbit_1, orbit_2 = lib.OrbitArray.broadcast(orbit_1, orbit_2)
+        orbit_i = find_intermediate_orbit(orbit_1, orbit_2)
+        orbit_j = find_extra_budget_orbit(extra_budget, orbit_1, orbit_2)
+
+        nodal_precession_1 = lib.nodal_precession(inc_1, orbit_1)
+        nodal_precession_2 = lib.nodal_precession(inc_2, orbit_2)
+
+        inc_delta = np.abs(inc_1 - inc_2)
+        inc_change_dv = np.minimum.reduce([
+            lib.inclination_change_dv(orbit_1, inc_delta),
+            lib.inclination_change_dv(orbit_2, inc_delta),
+            lib.inclination_change_dv(orbit_i, inc_delta)])
+
+        orbit_1_to_i = lib.coaxial_elliptic_orbit_change_dv(orbit_1, orbit_i)
+        orbit_i_to_2 = lib.coaxial_elliptic_orbit_change_dv(orbit_i, orbit_2)
+
+        shape = orbit_1.shape
+        return TransferInvariants(
+            extra_budget,
+            raan_1=np.broadcast_to(raan_1, shape),
+            rate_1=nodal_precession_1,
+            raan_2=np.broadcast_to(raan_2, shape),
+            rate_2=nodal_precession_2,
+            period_2=orbit_2.period,
+            rates=np.stack([
+                nodal_precession_1,
+                lib.nodal_precession(inc_2, orbit_i),
+                lib.nodal_precession(inc_2, orbit_j)]),
+            periods=np.stack([orbit_1.period, orbit_i.period, orbit_j.period]),
+            inc_change_dv=inc_change_dv,
+            inc_change_dv_j=np.minimum(inc_change_dv, lib.inclination_change_dv(orbit_j, inc_delta)),
+            hohmann_dv=orbit_1_to_i + orbit_i_to_2)
+
+
+class TransferCache:
+    """
+    LRU cache of TransferInvariants from one object to the objects of a catalog
+
+    Each row spans the whole catalog but is filled lazily,
+    so only the pairs that were asked for are ever computed
+    """
+    __slots__ = 'catalog', 'maxsize', 'rows', 'hits', 'misses'
+
+    def __init__(self, catalog: Catalog, maxsize: int = 32):
+        self.catalog = catalog
+        self.maxsize = maxsize
+        self.rows: OrderedDict[tuple, tuple[np.ndarray, TransferInvariants]] = OrderedDict()
+        self.hits = self.misses = 0 # pairs
+
+    def get(self, object_1: dict, positions: np.ndarray, extra_budget: float = 0) -> TransferInvariants:
+        key = (
+            int(object_1['NORAD_CAT_ID']), float(object_1['SEMIMAJOR_AXIS']), float(object_1['ECCENTRICITY']),
+            float(object_1['INCLINATION']), float(object_1['RA_OF_ASC_NODE']), extra_budget)
+        if key in self.rows:
+            self.rows.move_to_end(key)
+        else:
+            self.rows[key] = (np.zeros(len(self.catalog), dtype=bool), TransferInvariants.empty(len(self.catalog), extra_budget))
+            if len(self.rows) > self.maxsize:
+                self.rows.popitem(last=False)
+        computed, invariants = self.rows[key]
+
+        missing = positions[~computed[positions]]
+        self.misses += len(missing)
+        self.hits += len(positions) - len(missing)
+        if instrument.tracer:
+            instrument.tracer.count('transfer_cache.hits', len(positions) - len(missing))
+            instrument.tracer.count('transfer_cache.misses', len(missing))
+        if len(missing):
+            candidates = self.catalog[missing]
+            invariants.put(missing, transfer_invariants(
+                lib.OrbitArray.from_dicts([object_1]),
+                float(object_1['INCLINATION']),
+                float(object_1['RA_OF_ASC_NODE']),
+                candidates.orbits,
+                candidates['INCLINATION'],
+                candidates['RA_OF_ASC_NODE'],
+                extra_budget))
+            computed[missing] = True
+        return invariants.take(positions)
 
 
 def match_RAAN(
-        initial_orbit: lib.Orbit2d,
-        inclination: float,
-        target_precession_rate: float,
-        RAAN_delta: float
-        ) -> float:
+        initial_orbit: lib.Orbit2d | lib.OrbitArray,
+        inclination: float | np.ndarray,
+        target_precession_rate: float | np.ndarray,
+        RAAN_delta: float | np.ndarray
+        ) -> float | np.ndarray:
     """
     Calcualtes orbits needed to precess from one RAAN to another.
     """
     initial_precession_rate = lib.nodal_precession(inclination, initial_orbit)
     precession_rate_delta = target_precession_rate - initial_precession_rate
+    if isinstance(precession_rate_delta, np.ndarray):
+        RAAN_delta = np.where(precession_rate_delta < 0, RAAN_delta - 360, RAAN_delta)
+        return np.where(precession_rate_delta != 0, RAAN_delta / precession_rate_delta, np.inf)
     if precession_rate_delta < 0:
         RAAN_delta -= 360
     if precession_rate_delta:
@@ -111,7 +334,16 @@ def match_RAAN(
     return float('inf')
 
 
-def find_extra_budget_orbit(extra_budget: float, orbit_1: lib.Orbit2d, orbit_2: lib.Orbit2d) -> lib.Orbit2d:
+def find_extra_budget_orbit(extra_budget: float, orbit_1: lib.Orbit2d | lib.OrbitArray, orbit_2: lib.Orbit2d | lib.OrbitArray) -> lib.Orbit2d | lib.OrbitArray:
+    if isinstance(orbit_1, lib.OrbitArray) or isinstance(orbit_2, lib.OrbitArray):
+        orbit_1, orbit_2 = lib.OrbitArray.broadcast(orbit_1, orbit_2)
+        lowered = orbit_1.apoapsis_burn(-extra_budget / 2)
+        raised = orbit_2.periapsis_burn(extra_budget / 2)
+        use_lowered = orbit_1.period < orbit_2.period
+        return lib.OrbitArray(
+            np.where(use_lowered, lowered.semimajor_axis, raised.semimajor_axis),
+            np.where(use_lowered, lowered.eccentricity, raised.eccentricity))
+
     orbit_j: lib.Orbit2d
     if orbit_1.period < orbit_2.period:
         orbit_j = orbit_1.apoapsis_burn(-extra_budget / 2)
@@ -120,7 +352,7 @@ def find_extra_budget_orbit(extra_budget: float, orbit_1: lib.Orbit2d, orbit_2:
     return orbit_j
 
 
-def find_intermediate_orbit(orbit_1: lib.Orbit2d, orbit_2: lib.Orbit2d) -> lib.Orbit2d:
+def find_intermediate_orbit(orbit_1: lib.Orbit2d | lib.OrbitArray, orbit_2: lib.Orbit2d | lib.OrbitArray) -> lib.Orbit2d | lib.OrbitArray:
     """
     Intermediate orbit needed for arg of periapsis change
 
@@ -129,126 +361,412 @@ def find_intermediate_orbit(orbit_1: lib.Orbit2d, orbit_2: lib.Orbit2d) -> lib.O
 
     Not perfect, but good enough
     """
+    if isinstance(orbit_1, lib.OrbitArray) or isinstance(orbit_2, lib.OrbitArray):
+        return lib.OrbitArray(np.where(
+            orbit_1.apoapsis <= orbit_2.periapsis,
+            orbit_2.periapsis,
+            np.where(orbit_1.apoapsis >= orbit_2.apoapsis, orbit_2.apoapsis, orbit_1.apoapsis)))
     if orbit_1.apoapsis <= orbit_2.periapsis:
         radius = orbit_2.periapsis
     elif orbit_1.apoapsis >= orbit_2.apoapsis:
         radius = orbit_2.apoapsis
     else:
         radius = orbit_1.apoapsis
-    return lib.Orbit2d(radius)
+    return type(orbit_1)(radius)
 
 
-def match_mean_anomaly(orbit: lib.Orbit2d, period: float, orbits_to_precess: float) -> float:
+def match_mean_anomaly(orbit: lib.Orbit2d | lib.OrbitArray, period: float | np.ndarray, orbits_to_precess: float | np.ndarray) -> float | np.ndarray:
     """
     Calculates number of orbits to match mean anomaly,
     assuming both orbits are 360 degrees separated
     """
     precession = (period - orbit.period) / orbit.period
+    if isinstance(precession, np.ndarray):
+        return np.abs(1 / precession)
     return math.fabs(1 / precession)
 
 
-def get_objects():
+CATALOG_PATHS = ('../data/leo_debris.json.gz', '../data/leo_debris.json')
+# the catalog get.py replaced last, for catch.py replan
+PREVIOUS_CATALOG_PATH = '../data/leo_debris.previous.json.gz'
+
+### CHANGE THESE ###
+PER_CATCH_FUEL_BUDGET = 100 # m/s
+PER_CATCH_TIME_BUDGET = 10**7.7 # s
+TOTAL_FUEL_BUDGET = 1100 # m/s
+####################
+
+
+def get_objects() -> Catalog:
     """
-    Returns a list of objects from leo_debris.json
+    Returns the objects from leo_debris.json.gz (or leo_debris.json) as a Catalog
+
+    Parsed columns are cached next to the file, see catalog.load
     """
-    import json
+    for path in CATALOG_PATHS:
+        try:
+            return load_catalog(path)
+        except FileNotFoundError:
+            pass
+    print('leo_debris.json.gz not found, ensure you have run get.py')
+    exit(1)
 
-    try:
-        with open('../data/leo_debris.json', mode='r', encoding='UTF-8') as f:
-            objects = json.load(f)
-    except FileNotFoundError:
-        print('leo_debris.json not found, ensure you have run get.py')
-    return objects
+
+def planning_objects(objects: Catalog) -> Catalog:
+    """
+    The objects plans are made over, sorted by inclination then RAAN
+
+    Eccentric orbits are filtered out, otherwise the cost to circularize is high
+    """
+    return objects[
+        (objects['ECCENTRICITY'] < 0.007) & (400 < objects['APOAPSIS']) & (objects['APOAPSIS'] < 600)
+    ].sorted('INCLINATION', 'RA_OF_ASC_NODE')
 
 
 def collect(
-        objects: list[dict],
+        objects: list[dict] | Catalog,
         start: int,
         per_catch_fuel_budget: float,
         per_catch_time_target: float,
-        total_fuel_budget: float
+        total_fuel_budget: float,
+        choose: str | pareto.Chooser = 'first',
+        index: CandidateIndex | None = None,
+        cache: TransferCache | None = None,
+        start_time: float = 0,
+        optimize_phasing: bool = False
         ) -> tuple[list[dict], float, float, list[tuple[float, float, int]]]:
     """
     Collects objects continuously until fuel budget is exhausted
+
+    A CandidateIndex and TransferCache over objects can be passed in
+    to reuse them across runs, the index's caught set is cleared first.
+    start_time offsets the mission start, the returned time is counted from it.
+    With optimize_phasing, transfers go through a searched phasing orbit
+    where that is faster (see phasing.improve)
     """
-    v = t = 0
+    if index is None:
+        index = CandidateIndex(objects if isinstance(objects, Catalog) else Catalog.from_objects(objects))
+    if cache is None:
+        cache = TransferCache(index.catalog)
+    index.caught.clear()
+    v = 0
+    t = start_time
     caught = [objects[start]]
+    index.mark_caught(int(caught[0]['NORAD_CAT_ID']))
     metadata = []
     while v < total_fuel_budget:
         try:
-            catch, dv, dt, index, debug_info = collect_one(objects, caught, start, per_catch_fuel_budget, per_catch_time_target, t)
+            catch, dv, dt, position = collect_one(
+                objects, caught, start, per_catch_fuel_budget, per_catch_time_target, t,
+                catalog=index.catalog, choose=choose, index=index, cache=cache, optimize_phasing=optimize_phasing)
         except ValueError:
             break
         v += dv
         t += dt
         caught.append(catch)
-        metadata.append((dv, dt, index, debug_info))
-    return caught, v, t, metadata
+        index.mark_caught(int(catch['NORAD_CAT_ID']))
+        metadata.append((dv, dt, position))
+    return caught, v, t - start_time, metadata
 
 
 def collect_one(
-        objects: list[dict],
+        objects: list[dict] | Catalog,
         caught: list[dict],
         start: int,
         per_catch_fuel_budget: float,
         per_catch_time_target: float,
-        current_time: float):
+        current_time: float,
+        *,
+        catalog: Catalog | None = None,
+        choose: str | pareto.Chooser = 'first',
+        index: CandidateIndex | None = None,
+        cache: TransferCache | None = None,
+        optimize_phasing: bool = False
+        ) -> tuple[dict, float, float, int]:
     """
     Collects one object
 
-    Makes sure dt is within target time
+    Makes sure dt is within target time.
+    Every remaining object after start is evaluated in one batch,
+    then the first (or the cheapest, with choose='best') feasible one is taken.
+    choose can also name another of CHOOSERS or be a chooser function.
+    With an index, only objects whose inclination change fits
+    per_catch_fuel_budget are evaluated, and its caught set is used.
+    With a cache, time-invariant terms of each pair are only computed once.
+    With optimize_phasing, candidates are also evaluated through searched phasing orbits
     """
-    index = start
-    while index < len(objects) - 1:
-        index += 1
-        if objects[index] in caught:
-            continue
-        try:
-            dv, dt, debug_info = resources_to_transfer(caught[-1], objects[index], current_time, per_catch_fuel_budget)
-        except ZeroDivisionError:
-            continue
-        if dt < per_catch_time_target:
-            return objects[index], dv, dt, index, debug_info
-    raise ValueError('No object found')
+    chooser = CHOOSERS[choose] if isinstance(choose, str) else choose
+    if catalog is None:
+        catalog = objects if isinstance(objects, Catalog) else Catalog.from_objects(objects)
+
+    candidates, dv, dt, valid = evaluate_next(
+        catalog, caught, start, per_catch_fuel_budget, current_time,
+        index=index, cache=cache, optimize_phasing=optimize_phasing)
+    in_time = dt < per_catch_time_target
+    feasible = np.flatnonzero(valid & in_time)
+
+    if instrument.tracer:
+        instrument.tracer.count('candidates.evaluated', len(candidates))
+        # invalid transfers are the ones the scalar path raises ZeroDivisionError for
+        instrument.tracer.count('rejected.degenerate', int(np.count_nonzero(~valid)))
+        instrument.tracer.count('rejected.time_target', int(np.count_nonzero(valid & ~in_time)))
+        # objects after start skipped by the index, for their inclination or because they were caught
+        instrument.tracer.count('candidates.skipped', len(catalog) - start - 1 - len(candidates))
+
+    if not len(feasible):
+        raise ValueError('No object found')
+
+    choice = chooser(feasible, dv, dt)
+    position = int(candidates[choice])
+    if instrument.tracer:
+        instrument.tracer.event(
+            'catch', position=position, candidates=len(candidates), feasible=len(feasible),
+            dv=float(dv[choice]), dt=float(dt[choice]), phasing=optimize_phasing)
+        if not optimize_phasing:
+            # rerun the scalar path for its breakdown of the chosen transfer,
+            # which only covers the fixed orbits, not a searched phasing orbit
+            resources_to_transfer(caught[-1], objects[position], current_time, per_catch_fuel_budget)
+    return objects[position], float(dv[choice]), float(dt[choice]), position
+
+
+def evaluate_next(
+        catalog: Catalog,
+        caught: list[dict],
+        start: int,
+        per_catch_fuel_budget: float,
+        current_time: float,
+        *,
+        index: CandidateIndex | None = None,
+        cache: TransferCache | None = None,
+        optimize_phasing: bool = False
+        ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Every remaining candidate after start from the last caught object, in one batch
+
+    Returns the candidate positions with their dv, dt and valid mask
+    """
+    with instrument.timer('collect_one.candidates'):
+        if index is not None:
+            candidates = index.candidates(caught[-1], start, per_catch_fuel_budget)
+        else:
+            candidates = np.arange(start + 1, len(catalog))
+            caught_ids = [int(obj['NORAD_CAT_ID']) for obj in caught]
+            candidates = candidates[~np.isin(catalog['NORAD_CAT_ID'][candidates], caught_ids)]
+
+    with instrument.timer('collect_one.evaluate'):
+        if cache is not None:
+            dv, dt, valid = cache.get(caught[-1], candidates, per_catch_fuel_budget).evaluate(current_time)
+        else:
+            dv, dt, valid = resources_to_transfer_batch(caught[-1], catalog[candidates], current_time, per_catch_fuel_budget)
+
+    if optimize_phasing:
+        with instrument.timer('collect_one.phasing'):
+            dv, dt, valid = phasing.improve(caught[-1], catalog[candidates], current_time, per_catch_fuel_budget, dv, dt, valid)
+    return candidates, dv, dt, valid
+
+
+class NextCatchAnalysis(NamedTuple):
+    positions: np.ndarray # candidate positions
+    dv: np.ndarray # m/s
+    dt: np.ndarray # s
+    feasible: np.ndarray # valid and within the time target
+    front: np.ndarray # indices of the feasible dv/dt pareto front, by increasing dv
+
+    @property
+    def front_positions(self) -> np.ndarray:
+        return self.positions[self.front]
+
+
+def analyze_next_catch(
+        objects: list[dict] | Catalog,
+        caught: list[dict],
+        start: int,
+        per_catch_fuel_budget: float,
+        per_catch_time_target: float,
+        current_time: float = 0,
+        *,
+        index: CandidateIndex | None = None,
+        cache: TransferCache | None = None
+        ) -> NextCatchAnalysis:
+    """
+    Every candidate collect_one would consider, with the pareto optimal ones in dv and dt
+    """
+    catalog = objects if isinstance(objects, Catalog) else Catalog.from_objects(objects)
+    candidates, dv, dt, valid = evaluate_next(catalog, caught, start, per_catch_fuel_budget, current_time, index=index, cache=cache)
+    feasible = valid & (dt < per_catch_time_target)
+    indices = np.flatnonzero(feasible)
+    return NextCatchAnalysis(candidates, dv, dt, feasible, indices[pareto.pareto_front(dv[indices], dt[indices])])
 
 
-def deorbit_dv(orbit: lib.Orbit2d) -> float:
+CHOOSERS: dict[str, pareto.Chooser] = {
+    'first': lambda feasible, dv, dt: feasible[0],
+    'best': lambda feasible, dv, dt: feasible[np.argmin(dv[feasible])],
+    # off the dv/dt pareto front
+    'weighted': pareto.weighted(0.5),
+    'lexicographic': pareto.lexicographic('dv', tolerance=1), # m/s
+}
+
+
+def deorbit_dv(orbit: lib.Orbit2d | lib.OrbitArray) -> float | np.ndarray:
     """
     Calculates delta-v needed to deorbit an object to the ground
     """
-    return lib.coaxial_elliptic_orbit_change_dv(
-        orbit,
-        lib.Orbit2d.from_apsides(orbit.apoapsis, constants.EARTH_MEAN_RADIUS))
+    if isinstance(orbit, lib.OrbitArray):
+        return lib.coaxial_apsides_change_dv(
+            orbit.periapsis, orbit.apoapsis,
+            np.minimum(orbit.apoapsis, constants.EARTH_MEAN_RADIUS), np.maximum(orbit.apoapsis, constants.EARTH_MEAN_RADIUS),
+            orbit.gravitational_parameter)
+    return lib.coaxial_apsides_change_dv(
+        orbit.periapsis, orbit.apoapsis,
+        min(orbit.apoapsis, constants.EARTH_MEAN_RADIUS), max(orbit.apoapsis, constants.EARTH_MEAN_RADIUS),
+        orbit.gravitational_parameter)
 
 
 if __name__ == '__main__':
-    objects = get_objects()
-    # filter out eccentric orbits otherwise cost to circularize is high
-    s_objects = sorted(
-        list(obj for obj in objects if float(obj['ECCENTRICITY']) < 0.007 and 400 < float(obj['APOAPSIS']) < 600),
-        key=lambda obj: (float(obj['INCLINATION']), float(obj['RA_OF_ASC_NODE'])))
+    s_objects = planning_objects(get_objects())
 
     import sys
 
-    ### CHANGE THESE ###
-    PER_CATCH_FUEL_BUDGET = 100 # m/s
-    PER_CATCH_TIME_BUDGET = 10**7.7 # s
-    TOTAL_FUEL_BUDGET = 1100 # m/s
-    ####################
+    trace_path = None
+    if '--trace' in sys.argv:
+        # --trace FILE, write planner events, timers and counters as JSON lines
+        position = sys.argv.index('--trace')
+        trace_path = sys.argv[position + 1]
+        del sys.argv[position:position + 2]
+        instrument.enable()
+
+    if '--epoch' in sys.argv:
+        # --epoch TIME, propagate every object to one ISO 8601 time, or to the newest EPOCH with latest
+        import propagate
+        position = sys.argv.index('--epoch')
+        s_objects = propagate.to_epoch(s_objects, sys.argv[position + 1]).sorted('INCLINATION', 'RA_OF_ASC_NODE')
+        del sys.argv[position:position + 2]
+
+    optimize_phasing = '--phasing' in sys.argv
+    if optimize_phasing:
+        # --phasing, search phasing orbits for every transfer instead of only the fixed ones
+        sys.argv.remove('--phasing')
+        if len(sys.argv) > 1 and sys.argv[1] in ('beam', 'window', 'montecarlo', 'replan'):
+            # these evaluate transfers without collect, or compare against routes planned without it
+            print(f'--phasing is only supported by START, best, sweep and fleet, not {sys.argv[1]}')
+            exit(1)
+
+    results_store = None
+    if '--no-store' in sys.argv:
+        # --no-store, always recompute instead of reading and writing ../data/results.sqlite
+        sys.argv.remove('--no-store')
+    elif trace_path is None:
+        # tracing needs the planner to actually run
+        import store
+        results_store = store.ResultStore()
+        catalog_key = s_objects.digest()
+        params_key = store.params_key(PER_CATCH_FUEL_BUDGET, PER_CATCH_TIME_BUDGET, TOTAL_FUEL_BUDGET, optimize_phasing=optimize_phasing)
+
+    if len(sys.argv) > 1 and sys.argv[1] == 'best':
+        # best [MAX_DV], stored routes for this catalog and these budgets under MAX_DV total
+        if results_store is None:
+            print('best reads the result store, run without --no-store and --trace')
+            exit(1)
+        max_total_dv = float(sys.argv[2]) if len(sys.argv) > 2 else float('inf')
+        for run in results_store.best(catalog_key, params_key, max_total_dv):
+            print(f'{run.start:5}: {run.caught:3} caught, {run.dv:5.0f} + {run.deorbit_dv:4.0f} = {run.total_dv:5.0f} m/s, {run.time/60/60/24/365:5.2f} years')
+        exit(0)
+
+    if len(sys.argv) > 1 and sys.argv[1] == 'replan':
+        # replan [OLD_CATALOG], carry the routes stored for the catalog before the last get.py over to this one
+        if results_store is None:
+            print('replan reads the result store, run without --no-store and --trace')
+            exit(1)
+        import replan
+        old_path = sys.argv[2] if len(sys.argv) > 2 else PREVIOUS_CATALOG_PATH
+        try:
+            old_objects = planning_objects(load_catalog(old_path))
+        except FileNotFoundError:
+            print(f'{old_path} not found, it is kept by get.py when it replaces the catalog')
+            exit(1)
+        replan.main(old_objects, s_objects, PER_CATCH_FUEL_BUDGET, PER_CATCH_TIME_BUDGET, TOTAL_FUEL_BUDGET, results_store)
+        exit(0)
+
+    if len(sys.argv) > 1 and sys.argv[1] == 'sweep':
+        # sweep [first [last]], every start index by default
+        import sweep
+        first = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+        last = int(sys.argv[3]) if len(sys.argv) > 3 else len(s_objects) - 1
+        sweep.main(
+            s_objects, range(first, last + 1), PER_CATCH_FUEL_BUDGET, PER_CATCH_TIME_BUDGET, TOTAL_FUEL_BUDGET,
+            results_store=results_store, optimize_phasing=optimize_phasing)
+        exit(0)
+
+    if len(sys.argv) > 2 and sys.argv[1] == 'window':
+        # window START [DAYS [STEP_HOURS]], scan launch offsets, hourly over a year by default
+        import window
+        days = float(sys.argv[3]) if len(sys.argv) > 3 else 365
+        step_hours = float(sys.argv[4]) if len(sys.argv) > 4 else 1
+        window.main(s_objects, int(sys.argv[2]), days, step_hours, PER_CATCH_FUEL_BUDGET, PER_CATCH_TIME_BUDGET, TOTAL_FUEL_BUDGET)
+        exit(0)
+
+    if len(sys.argv) > 2 and sys.argv[1] == 'fleet':
+        # fleet VEHICLES [ROUNDS], split the catalog between vehicles with TOTAL_FUEL_BUDGET each
+        import fleet
+        rounds = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+        fleet.main(s_objects, int(sys.argv[2]), PER_CATCH_FUEL_BUDGET, PER_CATCH_TIME_BUDGET, TOTAL_FUEL_BUDGET, rounds, optimize_phasing)
+        exit(0)
+
+    if len(sys.argv) > 2 and sys.argv[1] == 'montecarlo':
+        # montecarlo START [SAMPLES] [replan], perturb the elements and re-evaluate the greedy route, or re-plan it
+        import montecarlo
+        replan = 'replan' in sys.argv[3:]
+        numbers = [arg for arg in sys.argv[3:] if arg != 'replan']
+        samples = int(numbers[0]) if numbers else 100 if replan else 10_000
+        montecarlo.main(s_objects, int(sys.argv[2]), samples, PER_CATCH_FUEL_BUDGET, PER_CATCH_TIME_BUDGET, TOTAL_FUEL_BUDGET, replan=replan)
+        exit(0)
+
+    planner = collect
+    if len(sys.argv) > 1 and sys.argv[1] == 'beam':
+        # beam START, beam search instead of greedy collection
+        import beam
+        planner = beam.beam_search
+        del sys.argv[1]
+
     try:
         START = int(sys.argv[1])
     except IndexError:
         print('No start index given')
         print('Please enter a number between 0 and', len(s_objects) - 1)
         print('Example: py -3.11', sys.argv[0], '0')
+        print('Or plan with beam search: py -3.11', sys.argv[0], 'beam 0')
+        print('Or sweep a range of start indices: py -3.11', sys.argv[0], 'sweep 0', len(s_objects) - 1)
+        print('Or scan launch windows over a year: py -3.11', sys.argv[0], 'window 0')
+        print('Or sample the route under element errors: py -3.11', sys.argv[0], 'montecarlo 0')
+        print('Or plan a fleet of 10 vehicles: py -3.11', sys.argv[0], 'fleet 10')
+        print('Or list stored routes under 1200 m/s: py -3.11', sys.argv[0], 'best 1200')
+        print('Or carry stored routes over to a refreshed catalog: py -3.11', sys.argv[0], 'replan')
         exit(1)
 
-    caught, v, t, meta = collect(s_objects, START, PER_CATCH_FUEL_BUDGET, PER_CATCH_TIME_BUDGET, TOTAL_FUEL_BUDGET)
-
-    for dv, dt, i, debug_info in meta:
-        print(f'{i:3}: {dv:3.0f} m/s, 10^{math.log10(dt):4.2f} s')
-    print(f'cumulative ({len(caught) - 1}): {v:3.0f} m/s, {t:.0f} s (10^{math.log10(t):4.2f} s, {t/60/60/24/365:5.2f} years)')
-
-    dv_to_deorbit = deorbit_dv(lib.Orbit2d.from_dict(caught[-1]))
-    print(f'deorbit dv: {dv_to_deorbit:.2f} m/s')
-    print(f'total dv: {v + dv_to_deorbit:.2f} m/s')
+    try:
+        run = None
+        if planner is collect and results_store is not None:
+            run = results_store.get(catalog_key, params_key, START)
+        if run is not None:
+            print('(stored result)')
+            caught, v, t, meta = store.to_collect(s_objects, run)
+        else:
+            if planner is collect:
+                caught, v, t, meta = collect(s_objects, START, PER_CATCH_FUEL_BUDGET, PER_CATCH_TIME_BUDGET, TOTAL_FUEL_BUDGET, optimize_phasing=optimize_phasing)
+            else:
+                caught, v, t, meta = planner(s_objects, START, PER_CATCH_FUEL_BUDGET, PER_CATCH_TIME_BUDGET, TOTAL_FUEL_BUDGET)
+            if planner is collect and results_store is not None:
+                results_store.put(catalog_key, params_key, store.to_run(s_objects, START, v, t, meta, deorbit_dv(lib.Orbit2d.from_dict(caught[-1]))))
+
+        for dv, dt, i in meta:
+            print(f'{i:3}: {dv:3.0f} m/s, 10^{math.log10(dt):4.2f} s')
+        # nothing caught when no object fits the budgets from START
+        magnitude = f'10^{math.log10(t):4.2f} s, ' if t > 0 else ''
+        print(f'cumulative ({len(caught) - 1}): {v:3.0f} m/s, {t:.0f} s ({magnitude}{t/60/60/24/365:5.2f} years)')
+
+        dv_to_deorbit = deorbit_dv(lib.Orbit2d.from_dict(caught[-1]))
+        print(f'deorbit dv: {dv_to_deorbit:.2f} m/s')
+        print(f'total dv: {v + dv_to_deorbit:.2f} m/s')
+    finally:
+        if trace_path is not None:
+            instrument.tracer.write_jsonl(trace_path)
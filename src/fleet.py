@@ -0,0 +1,304 @@
+"""
+Fleet planning, several collectors each working their own part of the catalog
+
+The planning catalog is split into one cluster per vehicle by k-means over
+inclination and RAAN (as cos and sin, so it wraps), each vehicle's route is
+planned by collect in a worker process, then objects on the boundary between
+two clusters are moved across while that removes more objects per m/s of fleet dv
+"""
+from typing import Iterable, NamedTuple
+import numpy as np
+import lib
+import catch
+import sweep
+from candidates import CandidateIndex
+from catalog import Catalog
+
+
+class VehiclePlan(NamedTuple):
+    members: tuple[int, ...] # planning catalog positions of the vehicle's cluster
+    route: tuple[int, ...] # planning catalog positions, start first
+    dv: float # m/s
+    time: float # s
+    deorbit_dv: float # m/s
+    legs: tuple[tuple[float, float, int], ...] # collect's metadata, in planning catalog positions
+
+    @property
+    def caught(self) -> int:
+        return len(self.route) - 1
+
+    @property
+    def total_dv(self) -> float: # m/s
+        return self.dv + self.deorbit_dv
+
+
+class FleetPlan(NamedTuple):
+    vehicles: list[VehiclePlan]
+
+    @property
+    def caught(self) -> int:
+        return sum(vehicle.caught for vehicle in self.vehicles)
+
+    @property
+    def dv(self) -> float: # m/s
+        return sum(vehicle.dv for vehicle in self.vehicles)
+
+    @property
+    def deorbit_dv(self) -> float: # m/s
+        return sum(vehicle.deorbit_dv for vehicle in self.vehicles)
+
+    @property
+    def total_dv(self) -> float: # m/s
+        return self.dv + self.deorbit_dv
+
+    @property
+    def time(self) -> float: # s, until the last vehicle finishes
+        return max((vehicle.time for vehicle in self.vehicles), default=0)
+
+
+def features(objects: Catalog, raan_weight: float = 0.05) -> np.ndarray:
+    """
+    Points clustered by partition, inclination in radians then RAAN on a circle of radius raan_weight
+
+    Inclination changes are paid in dv while RAAN is mostly matched by waiting
+    for precession, so RAAN is weighted down
+    """
+    inclination = np.radians(objects['INCLINATION'])
+    raan = np.radians(objects['RA_OF_ASC_NODE'])
+    return np.column_stack([inclination, raan_weight * np.cos(raan), raan_weight * np.sin(raan)])
+
+
+def kmeans(points: np.ndarray, k: int, rng: np.random.Generator, iterations: int = 100) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Lloyd's algorithm from k-means++ centers
+
+    Returns the label of every point and its distance to every center.
+    A cluster left empty takes the point farthest from its own center
+    """
+    if not 0 < k <= len(points):
+        raise ValueError(f'k must be between 1 and {len(points)}')
+    centers = np.empty((k, points.shape[1]))
+    centers[0] = points[rng.integers(len(points))]
+    closest = np.square(points - centers[0]).sum(axis=1)
+    for cluster in range(1, k):
+        total = closest.sum()
+        centers[cluster] = points[rng.choice(len(points), p=closest / total) if total > 0 else rng.integers(len(points))]
+        np.minimum(closest, np.square(points - centers[cluster]).sum(axis=1), out=closest)
+
+    labels = None
+    for _ in range(iterations):
+        distances = np.sqrt(np.square(points[:, np.newaxis] - centers).sum(axis=2))
+        new_labels = np.argmin(distances, axis=1)
+        for cluster in np.flatnonzero(np.bincount(new_labels, minlength=k) == 0):
+            own = distances[np.arange(len(points)), new_labels]
+            # only take from clusters that keep a point
+            own[np.bincount(new_labels, minlength=k)[new_labels] == 1] = -1
+            new_labels[np.argmax(own)] = cluster
+        if labels is not None and np.array_equal(labels, new_labels):
+            break
+        labels = new_labels
+        counts = np.bincount(labels, minlength=k)
+        for axis in range(points.shape[1]):
+            centers[:, axis] = np.bincount(labels, weights=points[:, axis], minlength=k) / counts
+    distances = np.sqrt(np.square(points[:, np.newaxis] - centers).sum(axis=2))
+    return labels, distances
+
+
+def partition(objects: Catalog, k: int, raan_weight: float = 0.05, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Cluster label of every object and its distance to every cluster center
+    """
+    return kmeans(features(objects, raan_weight), k, np.random.default_rng(seed))
+
+
+def boundary_moves(labels: np.ndarray, distances: np.ndarray, margin: float = 0.25) -> dict[tuple[int, int], np.ndarray]:
+    """
+    Objects nearly as close to another cluster as to their own, grouped by (own, other) cluster
+
+    An object is on the boundary when its own center is no closer than
+    1 - margin times the distance to the next nearest one
+    """
+    if distances.shape[1] < 2:
+        return {}
+    nearest = np.argsort(distances, axis=1)[:, :2]
+    rows = np.arange(len(labels))
+    other = np.where(nearest[:, 0] == labels, nearest[:, 1], nearest[:, 0])
+    near = distances[rows, labels] >= (1 - margin) * distances[rows, other]
+    moves = {}
+    for position in np.flatnonzero(near):
+        moves.setdefault((int(labels[position]), int(other[position])), []).append(position)
+    return {pair: np.array(positions) for pair, positions in moves.items()}
+
+
+# the planning catalog clusters are taken from, set in each worker by _init_worker
+_objects: Catalog | None = None
+
+
+def _init_worker(objects: Catalog):
+    global _objects
+    _objects = objects
+
+
+def _plan(args: tuple[tuple[int, ...], float, float, float, bool]) -> VehiclePlan:
+    """
+    collect over one cluster, from its first object in planning order
+    """
+    members, per_catch_fuel_budget, per_catch_time_target, total_fuel_budget, optimize_phasing = args
+    positions = np.array(members)
+    objects = _objects[positions]
+    caught, v, t, meta = catch.collect(
+        objects, 0, per_catch_fuel_budget, per_catch_time_target, total_fuel_budget,
+        index=CandidateIndex(objects), cache=catch.TransferCache(objects), optimize_phasing=optimize_phasing)
+    legs = tuple((dv, dt, int(positions[position])) for dv, dt, position in meta)
+    route = (members[0],) + tuple(position for _, _, position in legs)
+    return VehiclePlan(members, route, v, t, catch.deorbit_dv(lib.Orbit2d.from_dict(caught[-1])), legs)
+
+
+class FleetPlanner:
+    """
+    Plans clusters across a process pool, remembering every plan by its members
+    """
+    __slots__ = 'objects', 'budgets', 'pool', 'plans'
+
+    def __init__(
+            self,
+            objects: Catalog,
+            per_catch_fuel_budget: float,
+            per_catch_time_target: float,
+            total_fuel_budget: float,
+            processes: int | None = None,
+            optimize_phasing: bool = False):
+        self.objects = objects
+        # collect's arguments after the catalog and start
+        self.budgets = (per_catch_fuel_budget, per_catch_time_target, total_fuel_budget, optimize_phasing)
+        self.pool = sweep.pool(processes, _init_worker, (objects,))
+        self.plans: dict[tuple[int, ...], VehiclePlan] = {}
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def plan(self, clusters: Iterable[tuple[int, ...]]) -> list[VehiclePlan]:
+        """
+        A plan for every cluster (sorted planning positions), in the same order
+        """
+        clusters = list(clusters)
+        missing = list(dict.fromkeys(members for members in clusters if members not in self.plans))
+        for plan in self.pool.imap(_plan, [(members,) + self.budgets for members in missing]):
+            self.plans[plan.members] = plan
+        return [self.plans[members] for members in clusters]
+
+
+def efficiency(plans: list[VehiclePlan]) -> float:
+    """
+    Objects removed per m/s of total fleet dv, deorbits included
+    """
+    total_dv = sum(plan.total_dv for plan in plans)
+    return sum(plan.caught for plan in plans) / total_dv if total_dv else 0
+
+
+def rebalance(
+        planner: FleetPlanner,
+        labels: np.ndarray,
+        distances: np.ndarray,
+        rounds: int = 3,
+        margin: float = 0.25
+        ) -> tuple[np.ndarray, list[VehiclePlan]]:
+    """
+    Moves groups of boundary objects between neighbouring clusters
+
+    Every round re-plans both clusters of every possible move at once,
+    then applies the moves that raise the fleet's efficiency best first,
+    skipping moves that touch a cluster another applied move already changed.
+    Returns the new labels and the plan of every cluster
+    """
+    labels = labels.copy()
+    k = distances.shape[1]
+    clusters = [tuple(np.flatnonzero(labels == cluster).tolist()) for cluster in range(k)]
+    plans = planner.plan(clusters)
+    for _ in range(rounds):
+        moves = [
+            (pair, positions) for pair, positions in boundary_moves(labels, distances, margin).items()
+            # a cluster always keeps an object to start from
+            if len(positions) < len(clusters[pair[0]])]
+        proposed = []
+        for (source, target), positions in moves:
+            moved = set(positions.tolist())
+            proposed.append((
+                tuple(position for position in clusters[source] if position not in moved),
+                tuple(sorted(clusters[target] + tuple(moved)))))
+        results = planner.plan([members for pair in proposed for members in pair])
+
+        improvements = []
+        current = efficiency(plans)
+        for move, (source_plan, target_plan) in enumerate(zip(results[::2], results[1::2])):
+            (source, target), _ = moves[move]
+            after = [source_plan if cluster == source else target_plan if cluster == target else plan for cluster, plan in enumerate(plans)]
+            gain = efficiency(after) - current
+            if gain > 0:
+                improvements.append((gain, move))
+        changed = set()
+        for gain, move in sorted(improvements, reverse=True):
+            (source, target), positions = moves[move]
+            if source in changed or target in changed:
+                continue
+            changed.update((source, target))
+            labels[positions] = target
+            clusters[source], clusters[target] = proposed[move]
+            plans[source], plans[target] = results[2 * move], results[2 * move + 1]
+        if not changed:
+            break
+    return labels, plans
+
+
+def plan_fleet(
+        objects: Catalog,
+        vehicles: int,
+        per_catch_fuel_budget: float,
+        per_catch_time_target: float,
+        total_fuel_budget: float,
+        rounds: int = 3,
+        raan_weight: float = 0.05,
+        seed: int = 0,
+        processes: int | None = None,
+        optimize_phasing: bool = False
+        ) -> tuple[FleetPlan, FleetPlan]:
+    """
+    Partitions objects between vehicles, each with total_fuel_budget, and plans them
+
+    Returns the fleet plan straight from the partition and the rebalanced one
+    """
+    labels, distances = partition(objects, vehicles, raan_weight, seed)
+    with FleetPlanner(objects, per_catch_fuel_budget, per_catch_time_target, total_fuel_budget, processes, optimize_phasing) as planner:
+        initial = planner.plan(tuple(np.flatnonzero(labels == cluster).tolist()) for cluster in range(vehicles))
+        _, rebalanced = rebalance(planner, labels, distances, rounds)
+    return FleetPlan(initial), FleetPlan(rebalanced)
+
+
+def main(
+        objects: Catalog,
+        vehicles: int,
+        per_catch_fuel_budget: float,
+        per_catch_time_target: float,
+        total_fuel_budget: float,
+        rounds: int = 3,
+        optimize_phasing: bool = False):
+    initial, fleet = plan_fleet(
+        objects, vehicles, per_catch_fuel_budget, per_catch_time_target, total_fuel_budget, rounds,
+        optimize_phasing=optimize_phasing)
+    print(f'partitioned: {initial.caught} caught, {initial.total_dv:.0f} m/s')
+    print(f'rebalanced:  {fleet.caught} caught, {fleet.total_dv:.0f} m/s')
+    for vehicle, plan in enumerate(fleet.vehicles):
+        inclinations = objects['INCLINATION'][list(plan.members)]
+        print(
+            f'vehicle {vehicle:2}: {len(plan.members):5} objects ({inclinations.min():6.2f} to {inclinations.max():6.2f} deg), '
+            f'{plan.caught:3} caught, {plan.dv:5.0f} + {plan.deorbit_dv:4.0f} = {plan.total_dv:5.0f} m/s, {plan.time/60/60/24/365:5.2f} years')
+    print(
+        f'fleet ({vehicles}): {fleet.caught} caught, {fleet.dv:.0f} + {fleet.deorbit_dv:.0f} = {fleet.total_dv:.0f} m/s, '
+        f'{fleet.time/60/60/24/365:5.2f} years until the last vehicle finishes')
@@ -11,8 +11,11 @@ def graph(incs: list[float]):
     plt.clf()
 
 def create_incs(input_filename: str):
+    import gzip
     import json
-    with open(input_filename, mode='r', encoding='UTF-8') as f:
+    # get.py writes the catalog gzipped
+    opener = gzip.open if input_filename.endswith('.gz') else open
+    with opener(input_filename, mode='rt', encoding='UTF-8') as f:
         objects = json.load(f)
     incs = list(map(lambda o: o['INCLINATION'], objects))
     return incs
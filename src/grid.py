@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import lib
+import constants
+
+
+CACHE_DIR = '../data/grid_cache'
+# cells per chunk, and grids smaller than this are not worth sending to workers
+CHUNK_CELLS = 1_000_000
+
+
+def _orbits(altitudes: np.ndarray, eccentricities: np.ndarray) -> lib.OrbitArray:
+    # altitude of the semimajor axis above the mean radius, like nodal_precession.main
+    return lib.OrbitArray(
+        (np.asarray(altitudes, dtype=np.float64) + constants.EARTH_MEAN_RADIUS)[np.newaxis, :, np.newaxis],
+        np.asarray(eccentricities, dtype=np.float64)[np.newaxis, np.newaxis, :])
+
+
+# each quantity gets inclinations shaped (I, 1, 1) and orbits shaped (1, A, E)
+def _nodal_precession(inclinations, orbits):
+    return lib.nodal_precession(inclinations, orbits) # deg/s
+
+
+def _period(inclinations, orbits):
+    return orbits.period # s
+
+
+def _inclination_change_dv(inclinations, orbits):
+    return lib.inclination_change_dv(orbits, 1) # m/s per deg
+
+
+def _deorbit_dv(inclinations, orbits):
+    return lib.coaxial_elliptic_orbit_change_dv(
+        orbits,
+        lib.OrbitArray.from_apsides(orbits.apoapsis, constants.EARTH_MEAN_RADIUS)) # m/s
+
+
+QUANTITIES = {
+    'nodal_precession': _nodal_precession,
+    'period': _period,
+    'inclination_change_dv': _inclination_change_dv,
+    'deorbit_dv': _deorbit_dv,
+}
+
+
+def _evaluate_chunk(quantity: str, inclinations: np.ndarray, altitudes: np.ndarray, eccentricities: np.ndarray) -> np.ndarray:
+    inclinations = np.asarray(inclinations, dtype=np.float64)[:, np.newaxis, np.newaxis]
+    values = QUANTITIES[quantity](inclinations, _orbits(altitudes, eccentricities))
+    return np.broadcast_to(values, (len(inclinations), len(altitudes), len(eccentricities)))
+
+
+def evaluate(
+        quantity: str,
+        inclinations: np.ndarray, # deg
+        altitudes: np.ndarray, # m
+        eccentricities: np.ndarray = (0,),
+        processes: int | None = None
+        ) -> np.ndarray:
+    """
+    quantity over every inclination x altitude x eccentricity, shaped in that order
+
+    Large grids are split along inclination into chunks evaluated by worker processes
+    """
+    inclinations, altitudes, eccentricities = (np.asarray(axis, dtype=np.float64) for axis in (inclinations, altitudes, eccentricities))
+    if quantity not in QUANTITIES:
+        raise KeyError(quantity)
+    rows = max(1, CHUNK_CELLS // (len(altitudes) * len(eccentricities)))
+    chunks = [inclinations[start:start + rows] for start in range(0, len(inclinations), rows)]
+    if len(chunks) == 1 or processes == 1:
+        return np.concatenate([_evaluate_chunk(quantity, chunk, altitudes, eccentricities) for chunk in chunks])
+
+    with ProcessPoolExecutor(processes) as pool:
+        results = pool.map(_evaluate_chunk, [quantity] * len(chunks), chunks, [altitudes] * len(chunks), [eccentricities] * len(chunks))
+        return np.concatenate(list(results))
+
+
+def cache_key(quantity: str, *axes: np.ndarray) -> str:
+    """
+    Hash of the quantity, the axes and the physical constants the grid depends on
+    """
+    digest = hashlib.sha256(json.dumps({
+        'quantity': quantity,
+        'constants': {name: getattr(constants, name) for name in dir(constants) if name.isupper()},
+    }, sort_keys=True).encode('UTF-8'))
+    for axis in axes:
+        digest.update(np.ascontiguousarray(axis, dtype=np.float64).tobytes())
+        digest.update(b'|')
+    return digest.hexdigest()[:32]
+
+
+def cached(
+        quantity: str,
+        inclinations: np.ndarray, # deg
+        altitudes: np.ndarray, # m
+        eccentricities: np.ndarray = (0,),
+        cache_dir: str = CACHE_DIR,
+        processes: int | None = None
+        ) -> np.ndarray:
+    """
+    evaluate, stored as .npy keyed by the quantity, axes and constants
+    """
+    inclinations, altitudes, eccentricities = (np.asarray(axis, dtype=np.float64) for axis in (inclinations, altitudes, eccentricities))
+    path = os.path.join(cache_dir, f'{quantity}-{cache_key(quantity, inclinations, altitudes, eccentricities)}.npy')
+    try:
+        return np.load(path)
+    except FileNotFoundError:
+        pass
+    values = evaluate(quantity, inclinations, altitudes, eccentricities, processes)
+    os.makedirs(cache_dir, exist_ok=True)
+    temp = path + '.tmp.npy'
+    np.save(temp, values)
+    os.replace(temp, path)
+    return values
@@ -0,0 +1,92 @@
+"""
+Structured planner instrumentation
+
+Off by default: call sites check `instrument.tracer` before building
+anything, and timer() hands back a shared no-op context manager.
+While a Tracer is installed it records typed events, per-stage timers
+and counters, which can be written out as JSON lines
+"""
+import json
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+
+
+class Tracer:
+    __slots__ = 'events', 'counters', 'timers', 'start'
+
+    def __init__(self):
+        self.events: list[dict] = []
+        self.counters: Counter[str] = Counter()
+        self.timers: defaultdict[str, list[float]] = defaultdict(lambda: [0, 0]) # [calls, s]
+        self.start = time.perf_counter()
+
+    def event(self, kind: str, **fields):
+        self.events.append({'kind': kind, 't': time.perf_counter() - self.start, **fields})
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] += n
+
+    @contextmanager
+    def timer(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            timer = self.timers[name]
+            timer[0] += 1
+            timer[1] += time.perf_counter() - start
+
+    def summary(self) -> dict:
+        return {
+            'kind': 'summary',
+            'counters': dict(self.counters),
+            'timers': {name: {'calls': calls, 'seconds': seconds} for name, (calls, seconds) in self.timers.items()}}
+
+    def write_jsonl(self, path: str):
+        """
+        One line per event, then a summary line with counters and timers
+        """
+        with open(path, mode='w', encoding='UTF-8') as f:
+            for event in self.events:
+                f.write(json.dumps(event) + '\n')
+            f.write(json.dumps(self.summary()) + '\n')
+
+
+tracer: Tracer | None = None
+_null_timer = nullcontext()
+
+
+def timer(name: str):
+    """
+    Times a stage while tracing, otherwise does nothing
+    """
+    if tracer is None:
+        return _null_timer
+    return tracer.timer(name)
+
+
+def enable() -> Tracer:
+    global tracer
+    tracer = Tracer()
+    return tracer
+
+
+def disable() -> Tracer | None:
+    global tracer
+    previous, tracer = tracer, None
+    return previous
+
+
+@contextmanager
+def tracing(path: str | None = None):
+    """
+    Traces the enclosed block, writing JSON lines to path if given
+    """
+    active = enable()
+    try:
+        yield active
+    finally:
+        disable()
+        if path is not None:
+            active.write_jsonl(path)
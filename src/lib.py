@@ -1,5 +1,6 @@
 import math
 from typing import Self
+import numpy as np
 import constants
 
 
@@ -30,7 +31,7 @@ class Orbit2d:
 
     @classmethod
     def from_apsides(cls, /, periapsis: float, apoapsis: float, **kwargs) -> Self:
-        periapsis, apoapsis = sorted([periapsis, apoapsis])
+        periapsis, apoapsis = min(periapsis, apoapsis), max(periapsis, apoapsis)
         return cls(semimajor_axis=(periapsis + apoapsis) / 2, eccentricity=(apoapsis - periapsis) / (apoapsis + periapsis), **kwargs)
 
     @classmethod
@@ -102,6 +103,201 @@ class Orbit2d:
         return self.semimajor_axis - other.semimajor_axis < 1e-6 and self.eccentricity - other.eccentricity < 1e-6
 
 
+class FrozenOrbit2d(Orbit2d):
+    """
+    Immutable Orbit2d with its derived quantities computed once
+
+    For orbits whose properties are read many times, like the ones set up per transfer
+    """
+    __slots__ = '_semiminor_axis', '_periapsis', '_apoapsis', '_periapsis_velocity', '_apoapsis_velocity', '_period'
+
+    def __init__(self, semimajor_axis: float, eccentricity: float = 0, gravitational_parameter: float = gravitational_parameter()):
+        initialize = super().__setattr__
+        initialize('semimajor_axis', semimajor_axis) # m
+        initialize('eccentricity', eccentricity) # unitless
+        initialize('gravitational_parameter', gravitational_parameter) # m^3 s^-2
+        for name in ('semiminor_axis', 'periapsis', 'apoapsis', 'periapsis_velocity', 'apoapsis_velocity', 'period'):
+            initialize('_' + name, getattr(Orbit2d, name).fget(self))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __repr__(self):
+        return f"FrozenOrbit2d(semimajor_axis={self.semimajor_axis}, eccentricity={self.eccentricity})"
+
+    @property
+    def semiminor_axis(self) -> float:
+        return self._semiminor_axis
+
+    @property
+    def periapsis(self) -> float:
+        return self._periapsis
+
+    @property
+    def apoapsis(self) -> float:
+        return self._apoapsis
+
+    @property
+    def periapsis_velocity(self) -> float:
+        return self._periapsis_velocity
+
+    @property
+    def apoapsis_velocity(self) -> float:
+        return self._apoapsis_velocity
+
+    @property
+    def period(self) -> float:
+        return self._period
+
+
+class OrbitArray:
+    """
+    Structure-of-arrays counterpart to Orbit2d
+
+    Every field is a contiguous float64 array of the same shape,
+    so properties, constructors and burns are evaluated for all orbits at once
+    """
+    __slots__ = 'semimajor_axis', 'eccentricity', 'gravitational_parameter'
+
+    def __init__(self, semimajor_axis: np.ndarray, eccentricity: np.ndarray | float = 0, gravitational_parameter: np.ndarray | float = gravitational_parameter()):
+        semimajor_axis, eccentricity, gravitational_parameter = np.broadcast_arrays(
+            np.asarray(semimajor_axis, dtype=np.float64),
+            np.asarray(eccentricity, dtype=np.float64),
+            np.asarray(gravitational_parameter, dtype=np.float64))
+        self.semimajor_axis = np.ascontiguousarray(semimajor_axis) # m
+        self.eccentricity = np.ascontiguousarray(eccentricity) # unitless
+        self.gravitational_parameter = np.ascontiguousarray(gravitational_parameter) # m^3 s^-2
+
+    def __repr__(self):
+        return f"OrbitArray(semimajor_axis={self.semimajor_axis}, eccentricity={self.eccentricity})"
+
+    def __len__(self) -> int:
+        return len(self.semimajor_axis)
+
+    def __getitem__(self, index) -> Orbit2d | Self:
+        if isinstance(index, (int, np.integer)):
+            return Orbit2d(
+                float(self.semimajor_axis[index]),
+                float(self.eccentricity[index]),
+                float(self.gravitational_parameter[index]))
+        return type(self)(self.semimajor_axis[index], self.eccentricity[index], self.gravitational_parameter[index])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        return self.semimajor_axis.shape
+
+    @classmethod
+    def broadcast(cls, *orbits: Orbit2d | Self) -> list[Self]:
+        """
+        Converts orbits to OrbitArrays of a common shape
+        """
+        fields = np.broadcast_arrays(*(
+            np.asarray(getattr(orbit, field), dtype=np.float64)
+            for orbit in orbits
+            for field in cls.__slots__))
+        return [cls(*fields[i:i + 3]) for i in range(0, len(fields), 3)]
+
+    @classmethod
+    def from_orbits(cls, orbits: list[Orbit2d]) -> Self:
+        return cls(
+            semimajor_axis=[orbit.semimajor_axis for orbit in orbits],
+            eccentricity=[orbit.eccentricity for orbit in orbits],
+            gravitational_parameter=[orbit.gravitational_parameter for orbit in orbits])
+
+    @classmethod
+    def from_dicts(cls, orbits: list[dict], **kwargs) -> Self:
+        return cls(
+            semimajor_axis=np.array([float(orbit['SEMIMAJOR_AXIS']) for orbit in orbits]) * 1000,
+            eccentricity=[float(orbit['ECCENTRICITY']) for orbit in orbits],
+            **kwargs)
+
+    @classmethod
+    def from_mean_motion(cls, mean_motion: np.ndarray, eccentricity: np.ndarray, gravitational_parameter: np.ndarray | float = gravitational_parameter()) -> Self:
+        return cls(
+            semimajor_axis=(gravitational_parameter / (2 * np.pi * np.asarray(mean_motion)) ** 2) ** (1 / 3),
+            eccentricity=eccentricity,
+            gravitational_parameter=gravitational_parameter)
+
+    @classmethod
+    def from_apsides(cls, /, periapsis: np.ndarray, apoapsis: np.ndarray, **kwargs) -> Self:
+        periapsis, apoapsis = np.minimum(periapsis, apoapsis), np.maximum(periapsis, apoapsis)
+        return cls(semimajor_axis=(periapsis + apoapsis) / 2, eccentricity=(apoapsis - periapsis) / (apoapsis + periapsis), **kwargs)
+
+    @classmethod
+    def from_velocities(cls, periapsis_velocity: np.ndarray, apoapsis_velocity: np.ndarray, gravitational_parameter: np.ndarray | float = gravitational_parameter()) -> Self:
+        periapsis = 2 * gravitational_parameter / ((apoapsis_velocity * periapsis_velocity) * (1 + (periapsis_velocity / apoapsis_velocity)))
+        apoapsis = periapsis * periapsis_velocity / apoapsis_velocity
+        return cls.from_apsides(periapsis, apoapsis, gravitational_parameter=gravitational_parameter)
+
+    @classmethod
+    def from_periapsis(cls, periapsis_distance: np.ndarray, periapsis_velocity: np.ndarray, gravitational_parameter: np.ndarray | float = gravitational_parameter()) -> Self:
+        semimajor_axis = -1 * gravitational_parameter * periapsis_distance / (periapsis_velocity ** 2 * periapsis_distance - 2 * gravitational_parameter)
+        apoapsis = 2 * semimajor_axis - periapsis_distance
+        return cls.from_apsides(periapsis_distance, apoapsis, gravitational_parameter=gravitational_parameter)
+
+    @classmethod
+    def from_apoapsis(cls, apoapsis_distance: np.ndarray, apoapsis_velocity: np.ndarray, gravitational_parameter: np.ndarray | float = gravitational_parameter()) -> Self:
+        semimajor_axis = -1 * gravitational_parameter * apoapsis_distance / (apoapsis_velocity ** 2 * apoapsis_distance - 2 * gravitational_parameter)
+        periapsis = 2 * semimajor_axis - apoapsis_distance
+        return cls.from_apsides(periapsis, apoapsis_distance, gravitational_parameter=gravitational_parameter)
+
+    def periapsis_burn(self, delta_v: np.ndarray | float) -> Self:
+        return self.from_periapsis(self.periapsis, self.periapsis_velocity + delta_v, self.gravitational_parameter)
+
+    def apoapsis_burn(self, delta_v: np.ndarray | float) -> Self:
+        return self.from_apoapsis(self.apoapsis, self.apoapsis_velocity + delta_v, self.gravitational_parameter)
+
+    @property
+    def semiminor_axis(self) -> np.ndarray:
+        return self.semimajor_axis * np.sqrt(1 - self.eccentricity ** 2)
+
+    @property
+    def specific_angular_momentum(self) -> np.ndarray:
+        return np.sqrt(self.gravitational_parameter * self.semimajor_axis * (1 - self.eccentricity**2))
+
+    @property
+    def periapsis(self) -> np.ndarray:
+        return self.semimajor_axis * (1 - self.eccentricity)
+
+    @property
+    def apoapsis(self) -> np.ndarray:
+        return self.semimajor_axis * (1 + self.eccentricity)
+
+    @property
+    def periapsis_velocity(self) -> np.ndarray:
+        return np.sqrt((self.gravitational_parameter * self.semiminor_axis ** 2) / (self.semimajor_axis * self.periapsis ** 2))
+
+    @property
+    def apoapsis_velocity(self) -> np.ndarray:
+        return np.sqrt((self.gravitational_parameter * self.semiminor_axis ** 2) / (self.semimajor_axis * self.apoapsis ** 2))
+
+    @property
+    def period(self) -> np.ndarray:
+        return 2 * np.pi * np.sqrt((self.semimajor_axis**3) / self.gravitational_parameter)
+
+    @property
+    def angular_velocity(self) -> np.ndarray:
+        return 2 * np.pi / self.period
+
+    def apoapsis_altitude(self, body_radius: float = constants.EARTH_MEAN_RADIUS) -> np.ndarray:
+        return self.apoapsis - body_radius
+
+    def periapsis_altitude(self, body_radius: float = constants.EARTH_MEAN_RADIUS) -> np.ndarray:
+        return self.periapsis - body_radius
+
+
+def _is_vectorized(*args) -> bool:
+    return any(isinstance(arg, (OrbitArray, np.ndarray)) for arg in args)
+
+
+
 def period(
         semimajor_axis: float, # m
         gravitational_parameter: int = gravitational_parameter() # m^3 s^-2
@@ -121,42 +317,134 @@ def angular_velocity(
 
 
 def nodal_precession(
-        inclination: float, # deg
-        orbit: Orbit2d,
+        inclination: float | np.ndarray, # deg
+        orbit: Orbit2d | OrbitArray,
         *,
         equitorial_radius: int = constants.EARTH_EQUITORIAL_RADIUS, # m
         j2: float = constants.EARTH_J2, # unitless
-        ) -> float: # deg/s
+        ) -> float | np.ndarray: # deg/s
     """
     Returns the approximate nodal precession rate of a satellite
 
     https://en.wikipedia.org/wiki/Nodal_precession#Rate_of_precession
     """
+    if _is_vectorized(inclination, orbit):
+        return np.degrees((-3 * equitorial_radius**2 * j2 * orbit.angular_velocity * np.cos(np.radians(inclination)))
+         / (2 * (orbit.semimajor_axis * (1 - orbit.eccentricity**2))**2))
     return math.degrees((-3 * equitorial_radius**2 * j2 * orbit.angular_velocity * math.cos(math.radians(inclination)))
      / (2 * (orbit.semimajor_axis * (1 - orbit.eccentricity**2))**2))
 
 
-def inclination_change_dv(orbit: Orbit2d, inclination_delta: float) -> float:
+def apsidal_precession(
+        inclination: float | np.ndarray, # deg
+        orbit: Orbit2d | OrbitArray,
+        *,
+        equitorial_radius: int = constants.EARTH_EQUITORIAL_RADIUS, # m
+        j2: float = constants.EARTH_J2, # unitless
+        ) -> float | np.ndarray: # deg/s
+    """
+    Returns the approximate J2 rate of change of the argument of periapsis
+
+    https://en.wikipedia.org/wiki/Apsidal_precession
+    """
+    if _is_vectorized(inclination, orbit):
+        return np.degrees((3 * equitorial_radius**2 * j2 * orbit.angular_velocity * (5 * np.cos(np.radians(inclination))**2 - 1))
+         / (4 * (orbit.semimajor_axis * (1 - orbit.eccentricity**2))**2))
+    return math.degrees((3 * equitorial_radius**2 * j2 * orbit.angular_velocity * (5 * math.cos(math.radians(inclination))**2 - 1))
+     / (4 * (orbit.semimajor_axis * (1 - orbit.eccentricity**2))**2))
+
+
+def mean_anomaly_rate(
+        inclination: float | np.ndarray, # deg
+        orbit: Orbit2d | OrbitArray,
+        *,
+        equitorial_radius: int = constants.EARTH_EQUITORIAL_RADIUS, # m
+        j2: float = constants.EARTH_J2, # unitless
+        ) -> float | np.ndarray: # deg/s
+    """
+    Returns the mean motion including the secular J2 correction
+    """
+    if _is_vectorized(inclination, orbit):
+        return np.degrees(orbit.angular_velocity * (1 + (3 * equitorial_radius**2 * j2 * np.sqrt(1 - orbit.eccentricity**2) * (3 * np.cos(np.radians(inclination))**2 - 1))
+         / (4 * (orbit.semimajor_axis * (1 - orbit.eccentricity**2))**2)))
+    return math.degrees(orbit.angular_velocity * (1 + (3 * equitorial_radius**2 * j2 * math.sqrt(1 - orbit.eccentricity**2) * (3 * math.cos(math.radians(inclination))**2 - 1))
+     / (4 * (orbit.semimajor_axis * (1 - orbit.eccentricity**2))**2)))
+
+
+def inclination_change_dv(orbit: Orbit2d | OrbitArray, inclination_delta: float | np.ndarray) -> float | np.ndarray:
+    if _is_vectorized(orbit, inclination_delta):
+        return 2 * orbit.periapsis_velocity * np.sin(np.radians(inclination_delta) / 2)
     return 2 * orbit.periapsis_velocity * math.sin(math.radians(inclination_delta / 2))
 
 
-def coaxial_elliptic_orbit_change_dv(initial: Orbit2d, final: Orbit2d) -> float:
-    if abs(initial.periapsis - final.periapsis) <= 1e-6:
-        return abs(initial.periapsis_velocity - final.periapsis_velocity)
-    if abs(initial.periapsis - final.apoapsis) <= 1e-6:
-        return abs(initial.periapsis_velocity - final.apoapsis_velocity)
-    if abs(initial.apoapsis - final.periapsis) <= 1e-6:
-        return abs(initial.apoapsis_velocity - final.periapsis_velocity)
-    if abs(initial.apoapsis - final.apoapsis) <= 1e-6:
-        return abs(initial.apoapsis_velocity - final.apoapsis_velocity)
+def coaxial_elliptic_orbit_change_dv(initial: Orbit2d | OrbitArray, final: Orbit2d | OrbitArray) -> float | np.ndarray:
+    return coaxial_apsides_change_dv(
+        initial.periapsis, initial.apoapsis,
+        final.periapsis, final.apoapsis,
+        initial.gravitational_parameter)
 
-    intermediate_a = Orbit2d.from_apsides(initial.periapsis, final.apoapsis)
-    intermediate_b = Orbit2d.from_apsides(final.periapsis, initial.apoapsis)
 
+def coaxial_apsides_change_dv(
+        initial_periapsis: float | np.ndarray, # m
+        initial_apoapsis: float | np.ndarray, # m
+        final_periapsis: float | np.ndarray, # m
+        final_apoapsis: float | np.ndarray, # m
+        gravitational_parameter: float | np.ndarray = gravitational_parameter() # m^3 s^-2
+        ) -> float | np.ndarray: # m/s
+    """
+    Cheapest change between coaxial orbits, straight from their apsides
+
+    Orbits sharing an apsis take one burn there, checked in the order
+    periapsis-periapsis, periapsis-apoapsis, apoapsis-periapsis, apoapsis-apoapsis.
+    Otherwise two burns through the orbit from initial periapsis to final apoapsis
+    or the one from final periapsis to initial apoapsis, whichever is cheaper.
+    Velocities come from vis-viva, v = sqrt(2 mu other / (r (r + other)))
+    at apsis r of an orbit whose other apsis is other
+    """
+    p1, a1, p2, a2 = initial_periapsis, initial_apoapsis, final_periapsis, final_apoapsis
+    if _is_vectorized(p1, a1, p2, a2, gravitational_parameter):
+        return _coaxial_apsides_change_dv_array(p1, a1, p2, a2, gravitational_parameter)
+
+    mu2 = 2 * gravitational_parameter
+    initial_p = math.sqrt(mu2 * a1 / (p1 * (p1 + a1)))
+    initial_a = math.sqrt(mu2 * p1 / (a1 * (p1 + a1)))
+    final_p = math.sqrt(mu2 * a2 / (p2 * (p2 + a2)))
+    final_a = math.sqrt(mu2 * p2 / (a2 * (p2 + a2)))
+
+    if abs(p1 - p2) <= 1e-6:
+        return abs(initial_p - final_p)
+    if abs(p1 - a2) <= 1e-6:
+        return abs(initial_p - final_a)
+    if abs(a1 - p2) <= 1e-6:
+        return abs(initial_a - final_p)
+    if abs(a1 - a2) <= 1e-6:
+        return abs(initial_a - final_a)
+
+    # through the orbit with apsides p1 and a2, or the one with p2 and a1
     return min(
-        coaxial_elliptic_orbit_change_dv(initial, intermediate_a) + coaxial_elliptic_orbit_change_dv(intermediate_a, final),
-        coaxial_elliptic_orbit_change_dv(initial, intermediate_b) + coaxial_elliptic_orbit_change_dv(intermediate_b, final))
+        abs(initial_p - math.sqrt(mu2 * a2 / (p1 * (p1 + a2)))) + abs(math.sqrt(mu2 * p1 / (a2 * (p1 + a2))) - final_a),
+        abs(initial_a - math.sqrt(mu2 * p2 / (a1 * (a1 + p2)))) + abs(math.sqrt(mu2 * a1 / (p2 * (a1 + p2))) - final_p))
 
 
-def arg_of_periapsis_change_dv(orbit: Orbit2d, arg_of_periapsis_delta: float) -> float:
+def _coaxial_apsides_change_dv_array(p1: np.ndarray, a1: np.ndarray, p2: np.ndarray, a2: np.ndarray, gravitational_parameter: np.ndarray) -> np.ndarray:
+    """
+    Same cases as the scalar version, every case is evaluated and np.select keeps the first match
+    """
+    mu2 = 2 * np.asarray(gravitational_parameter)
+    initial_p = np.sqrt(mu2 * a1 / (p1 * (p1 + a1)))
+    initial_a = np.sqrt(mu2 * p1 / (a1 * (p1 + a1)))
+    final_p = np.sqrt(mu2 * a2 / (p2 * (p2 + a2)))
+    final_a = np.sqrt(mu2 * p2 / (a2 * (p2 + a2)))
+
+    return np.select(
+        [np.abs(p1 - p2) <= 1e-6, np.abs(p1 - a2) <= 1e-6, np.abs(a1 - p2) <= 1e-6, np.abs(a1 - a2) <= 1e-6],
+        [np.abs(initial_p - final_p), np.abs(initial_p - final_a), np.abs(initial_a - final_p), np.abs(initial_a - final_a)],
+        np.minimum(
+            np.abs(initial_p - np.sqrt(mu2 * a2 / (p1 * (p1 + a2)))) + np.abs(np.sqrt(mu2 * p1 / (a2 * (p1 + a2))) - final_a),
+            np.abs(initial_a - np.sqrt(mu2 * p2 / (a1 * (a1 + p2)))) + np.abs(np.sqrt(mu2 * a1 / (p2 * (a1 + p2))) - final_p)))
+
+
+def arg_of_periapsis_change_dv(orbit: Orbit2d | OrbitArray, arg_of_periapsis_delta: float | np.ndarray) -> float | np.ndarray:
+    if _is_vectorized(orbit, arg_of_periapsis_delta):
+        return 2 * orbit.eccentricity * np.sqrt(orbit.gravitational_parameter / (orbit.semimajor_axis * (1 - orbit.eccentricity**2))) * np.sin(np.radians(arg_of_periapsis_delta)/2)
     return 2 * orbit.eccentricity * (orbit.gravitational_parameter / (orbit.semimajor_axis * (1 - orbit.eccentricity**2)))**0.5 * math.sin(math.radians(arg_of_periapsis_delta)/2)
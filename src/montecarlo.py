@@ -0,0 +1,272 @@
+"""
+Monte Carlo sensitivity of route costs to errors in the catalog elements
+
+Every sample perturbs SEMIMAJOR_AXIS, ECCENTRICITY, INCLINATION and RA_OF_ASC_NODE,
+with spreads that grow with each object's epoch age. A given route is re-evaluated
+leg by leg for a whole batch of samples at once, or the route is re-planned with
+collect on every perturbed catalog. Batches are seeded by their number from one
+SeedSequence, so the samples do not depend on the number of processes
+"""
+import math
+import os
+from typing import Callable, NamedTuple
+import numpy as np
+import lib
+import catch
+import sweep
+from candidates import CandidateIndex
+from catalog import Catalog
+
+
+# samples per batch, fixed so the seeding does not depend on the number of processes
+ROUTE_BATCH = 1024
+REPLAN_BATCH = 4
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+# unit variance draws, so every distribution has the spread given in Uncertainty
+DISTRIBUTIONS: dict[str, Callable[[np.random.Generator, tuple[int, ...]], np.ndarray]] = {
+    'normal': lambda rng, shape: rng.standard_normal(shape),
+    'uniform': lambda rng, shape: rng.uniform(-math.sqrt(3), math.sqrt(3), shape),
+    'laplace': lambda rng, shape: rng.laplace(0, 1 / math.sqrt(2), shape),
+}
+
+
+class Uncertainty(NamedTuple):
+    """
+    Standard deviations of the element errors at zero epoch age
+    """
+    semimajor_axis: float = 0.05 # km
+    eccentricity: float = 1e-5 # unitless
+    inclination: float = 0.005 # deg
+    raan: float = 0.01 # deg
+    growth: float = 0.1 # added to every spread per day of epoch age, as a fraction of it
+    distribution: str = 'normal'
+
+
+class RouteSamples(NamedTuple):
+    dv: np.ndarray # m/s, legs and deorbit of each sample
+    time: np.ndarray # s
+    feasible: np.ndarray # every leg valid and within the time target
+    leg_dv: np.ndarray # m/s, shaped (samples, legs)
+    leg_dt: np.ndarray # s, shaped (samples, legs)
+
+
+class ReplanSamples(NamedTuple):
+    caught: np.ndarray # objects caught after the start
+    dv: np.ndarray # m/s, legs and deorbit of each sample
+    time: np.ndarray # s
+
+
+def epoch_ages(objects: Catalog, reference=None) -> np.ndarray: # days
+    """
+    Age of each object's EPOCH at reference, the newest EPOCH by default
+
+    Objects without an EPOCH are treated as current
+    """
+    epochs = np.asarray(objects['EPOCH'], dtype='datetime64[us]')
+    known = ~np.isnat(epochs)
+    if reference is None:
+        if not known.any():
+            return np.zeros(len(objects))
+        reference = epochs[known].max()
+    ages = (np.datetime64(reference, 'us') - epochs) / np.timedelta64(1, 'D')
+    return np.where(known, np.maximum(ages, 0), 0)
+
+
+def perturb(
+        rng: np.random.Generator,
+        objects: Catalog,
+        ages: np.ndarray, # days
+        samples: int,
+        uncertainty: Uncertainty
+        ) -> dict[str, np.ndarray]:
+    """
+    Perturbed element columns, each shaped (samples, len(objects))
+    """
+    draw = DISTRIBUTIONS[uncertainty.distribution]
+    scale = 1 + uncertainty.growth * ages
+    shape = (samples, len(objects))
+    semimajor_axis = objects['SEMIMAJOR_AXIS'] + uncertainty.semimajor_axis * scale * draw(rng, shape)
+    eccentricity = np.abs(objects['ECCENTRICITY'] + uncertainty.eccentricity * scale * draw(rng, shape))
+    inclination = np.clip(objects['INCLINATION'] + uncertainty.inclination * scale * draw(rng, shape), 0, 180)
+    raan = (objects['RA_OF_ASC_NODE'] + uncertainty.raan * scale * draw(rng, shape)) % 360
+    return {
+        'SEMIMAJOR_AXIS': semimajor_axis,
+        'ECCENTRICITY': eccentricity,
+        'INCLINATION': inclination,
+        'RA_OF_ASC_NODE': raan,
+    }
+
+
+# the catalog and epoch ages sampled from, set in each worker by _init_worker
+_objects: Catalog | None = None
+_ages: np.ndarray | None = None
+
+
+def _init_worker(objects: Catalog, ages: np.ndarray):
+    global _objects, _ages
+    _objects = objects
+    _ages = ages
+
+
+def _route_batch(args: tuple[np.random.SeedSequence, int, Uncertainty, float, float]) -> tuple[np.ndarray, ...]:
+    """
+    Every leg of the route in _objects (in route order) for one batch of samples
+    """
+    seed, samples, uncertainty, per_catch_fuel_budget, per_catch_time_target = args
+    elements = perturb(np.random.default_rng(seed), _objects, _ages, samples, uncertainty)
+    orbits = lib.OrbitArray(elements['SEMIMAJOR_AXIS'] * 1000, elements['ECCENTRICITY'])
+    inclination, raan = elements['INCLINATION'], elements['RA_OF_ASC_NODE']
+
+    legs = len(_objects) - 1
+    leg_dv = np.empty((samples, legs))
+    leg_dt = np.empty((samples, legs))
+    feasible = np.ones(samples, dtype=bool)
+    time = np.zeros(samples)
+    for leg in range(legs):
+        dv, dt, valid = catch.transfer_batch(
+            orbits[:, leg], inclination[:, leg], raan[:, leg],
+            orbits[:, leg + 1], inclination[:, leg + 1], raan[:, leg + 1],
+            time, per_catch_fuel_budget)
+        feasible &= valid & (dt < per_catch_time_target)
+        leg_dv[:, leg] = dv
+        leg_dt[:, leg] = dt
+        time = time + dt
+    deorbit = catch.deorbit_dv(orbits[:, legs])
+    return leg_dv.sum(axis=1) + deorbit, time, feasible, leg_dv, leg_dt
+
+
+def _replan_batch(args: tuple[np.random.SeedSequence, int, Uncertainty, int, float, float, float, str]) -> tuple[np.ndarray, ...]:
+    """
+    collect from start over one perturbed copy of _objects per sample
+    """
+    seed, samples, uncertainty, start, per_catch_fuel_budget, per_catch_time_target, total_fuel_budget, choose = args
+    elements = perturb(np.random.default_rng(seed), _objects, _ages, samples, uncertainty)
+    caught = np.empty(samples, dtype=np.int64)
+    dv = np.empty(samples)
+    time = np.empty(samples)
+    for sample in range(samples):
+        columns = dict(_objects.columns)
+        for field, values in elements.items():
+            columns[field] = values[sample]
+        # positions keep their order, so start is the same object in every sample
+        objects = Catalog(columns)
+        route, v, t, _ = catch.collect(
+            objects, start, per_catch_fuel_budget, per_catch_time_target, total_fuel_budget,
+            choose=choose, index=CandidateIndex(objects), cache=catch.TransferCache(objects))
+        caught[sample] = len(route) - 1
+        dv[sample] = v + catch.deorbit_dv(lib.Orbit2d.from_dict(route[-1]))
+        time[sample] = t
+    return caught, dv, time
+
+
+def _run_batches(function, objects: Catalog, ages: np.ndarray, tasks: list[tuple], processes: int | None) -> list[tuple[np.ndarray, ...]]:
+    """
+    Batch results in task order, across a process pool unless there is one process or one task
+    """
+    processes = min(processes or os.cpu_count() or 1, len(tasks))
+    if processes <= 1:
+        _init_worker(objects, ages)
+        return [function(task) for task in tasks]
+    with sweep.pool(processes, _init_worker, (objects, ages)) as workers:
+        return workers.map(function, tasks)
+
+
+def _seeds(seed: int, samples: int, batch: int) -> list[tuple[np.random.SeedSequence, int]]:
+    """
+    Seed and sample count of each batch
+    """
+    sizes = [min(batch, samples - first) for first in range(0, samples, batch)]
+    return list(zip(np.random.SeedSequence(seed).spawn(len(sizes)), sizes))
+
+
+def sample_route(
+        objects: Catalog,
+        route: list[int],
+        per_catch_fuel_budget: float,
+        per_catch_time_target: float,
+        samples: int = 10_000,
+        uncertainty: Uncertainty = Uncertainty(),
+        seed: int = 0,
+        processes: int | None = None
+        ) -> RouteSamples:
+    """
+    dv and time of a fixed route (positions, start first) under perturbed elements
+
+    With zero uncertainty every sample matches collect's dv (plus deorbit) and time for the route
+    """
+    route_objects = objects[np.asarray(route)]
+    tasks = [
+        (batch_seed, size, uncertainty, per_catch_fuel_budget, per_catch_time_target)
+        for batch_seed, size in _seeds(seed, samples, ROUTE_BATCH)]
+    batches = _run_batches(_route_batch, route_objects, epoch_ages(objects)[route], tasks, processes)
+    return RouteSamples(*(np.concatenate(parts) for parts in zip(*batches)))
+
+
+def sample_replan(
+        objects: Catalog,
+        start: int,
+        per_catch_fuel_budget: float,
+        per_catch_time_target: float,
+        total_fuel_budget: float,
+        samples: int = 100,
+        uncertainty: Uncertainty = Uncertainty(),
+        seed: int = 0,
+        choose: str = 'first',
+        processes: int | None = None
+        ) -> ReplanSamples:
+    """
+    Greedy routes from start re-planned on every perturbed catalog
+    """
+    tasks = [
+        (batch_seed, size, uncertainty, start, per_catch_fuel_budget, per_catch_time_target, total_fuel_budget, choose)
+        for batch_seed, size in _seeds(seed, samples, REPLAN_BATCH)]
+    batches = _run_batches(_replan_batch, objects, epoch_ages(objects), tasks, processes)
+    return ReplanSamples(*(np.concatenate(parts) for parts in zip(*batches)))
+
+
+def percentiles(values: np.ndarray, q: tuple[float, ...] = PERCENTILES) -> dict[float, float]:
+    if not len(values):
+        return {p: float('nan') for p in q}
+    return dict(zip(q, np.percentile(values, q).tolist()))
+
+
+def _print_percentiles(name: str, values: np.ndarray, unit: str, scale: float = 1):
+    stats = '  '.join(f'p{p}: {value / scale:8.2f}' for p, value in percentiles(values).items())
+    label = f'{name} ({unit})'
+    print(f'{label:>18}: {stats}')
+
+
+def main(
+        objects: Catalog,
+        start: int,
+        samples: int,
+        per_catch_fuel_budget: float,
+        per_catch_time_target: float,
+        total_fuel_budget: float,
+        replan: bool = False,
+        uncertainty: Uncertainty = Uncertainty(),
+        seed: int = 0):
+    caught, v, t, meta = catch.collect(objects, start, per_catch_fuel_budget, per_catch_time_target, total_fuel_budget)
+    nominal_dv = v + catch.deorbit_dv(lib.Orbit2d.from_dict(caught[-1]))
+    print(f'nominal route: {len(meta)} caught, {nominal_dv:.2f} m/s, {t/60/60/24/365:5.2f} years')
+
+    if replan:
+        result = sample_replan(objects, start, per_catch_fuel_budget, per_catch_time_target, total_fuel_budget, samples, uncertainty, seed)
+        print(f'{samples} re-planned samples:')
+        _print_percentiles('caught', result.caught, 'objects')
+        _print_percentiles('total dv', result.dv, 'm/s')
+        _print_percentiles('time', result.time, 'years', 60 * 60 * 24 * 365)
+        return
+
+    route = [start] + [position for _, _, position in meta]
+    result = sample_route(objects, route, per_catch_fuel_budget, per_catch_time_target, samples, uncertainty, seed)
+    print(f'{samples} samples of the route, {np.count_nonzero(result.feasible)} with every leg valid and within the time target:')
+    _print_percentiles('total dv', result.dv[result.feasible], 'm/s')
+    _print_percentiles('time', result.time[result.feasible], 'years', 60 * 60 * 24 * 365)
+    if len(meta) and result.feasible.any():
+        # legs whose cost moves most with the element errors
+        spread = np.nanstd(np.where(result.feasible[:, np.newaxis], result.leg_dt, np.nan), axis=0)
+        for leg in np.argsort(spread)[::-1][:3]:
+            print(f'  leg {leg + 1} to {route[leg + 1]}: dt spread {spread[leg]/86400:7.2f} days')
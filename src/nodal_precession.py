@@ -1,11 +1,9 @@
-import math
 import matplotlib
 import matplotlib.pyplot as plt
 from matplotlib.colors import ListedColormap
 import numpy as np
 
-from lib import nodal_precession, Orbit2d
-import constants
+import grid
 
 
 def main():
@@ -15,10 +13,7 @@ def main():
     inc_delta = 15
 
 
-    omegas = np.zeros((len(inclinations), len(altitudes)))
-    for x, inc in enumerate(inclinations):
-        for y, alt in enumerate(altitudes):
-            omegas[x, y] = math.radians(nodal_precession(inc, Orbit2d(alt + constants.EARTH_MEAN_RADIUS)))
+    omegas = np.radians(grid.cached('nodal_precession', inclinations, altitudes)[:, :, 0])
 
 
     alt_ticks = range(0, len(altitudes) + 1, alt_delta // 1000)
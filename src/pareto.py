@@ -0,0 +1,58 @@
+"""
+dv against time trade-offs between next-catch candidates
+
+Choosers take the feasible candidate indices and the dv and dt arrays,
+and return the index of the candidate to catch, like catch.CHOOSERS
+"""
+from typing import Callable
+import numpy as np
+
+
+Chooser = Callable[[np.ndarray, np.ndarray, np.ndarray], int]
+
+
+def pareto_front(dv: np.ndarray, dt: np.ndarray) -> np.ndarray:
+    """
+    Indices of the points no other point beats in both dv and dt, by increasing dv
+
+    Sorted by dv, a point is on the front when its dt is below every dt before it,
+    so one sort and a running minimum find it. Points sharing a dv can come in any
+    order, so a kept point followed by another kept point at the same dv
+    (which then has a lower dt) is dropped. Of identical points only one is kept
+    """
+    order = np.argsort(dv)
+    if not len(order):
+        return order
+    dt_sorted = dt[order]
+    best_before = np.empty_like(dt_sorted)
+    best_before[0] = np.inf
+    np.minimum.accumulate(dt_sorted[:-1], out=best_before[1:])
+    front = order[dt_sorted < best_before]
+    return front[np.append(dv[front[1:]] != dv[front[:-1]], True)]
+
+
+def weighted(weight: float = 0.5) -> Chooser:
+    """
+    Chooses the front point minimizing (1 - weight) dv + weight dt,
+    each scaled by its largest value on the front
+    """
+    def choose(feasible: np.ndarray, dv: np.ndarray, dt: np.ndarray) -> int:
+        front = feasible[pareto_front(dv[feasible], dt[feasible])]
+        front_dv, front_dt = dv[front], dt[front]
+        scale_dv = max(front_dv.max(), np.finfo(np.float64).tiny)
+        scale_dt = max(front_dt.max(), np.finfo(np.float64).tiny)
+        return front[np.argmin((1 - weight) * front_dv / scale_dv + weight * front_dt / scale_dt)]
+    return choose
+
+
+def lexicographic(primary: str = 'dv', tolerance: float = 0) -> Chooser:
+    """
+    Chooses the least primary ('dv' or 'dt'), breaking ties within tolerance
+    (in the primary's units) by the other
+    """
+    def choose(feasible: np.ndarray, dv: np.ndarray, dt: np.ndarray) -> int:
+        first, second = (dv, dt) if primary == 'dv' else (dt, dv)
+        values = first[feasible]
+        near = feasible[values <= values.min() + tolerance]
+        return near[np.argmin(second[near])]
+    return choose
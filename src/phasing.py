@@ -0,0 +1,229 @@
+"""
+Searched phasing orbits, as an alternative to the fixed intermediate and extra budget orbits
+
+The chaser transfers to a circular waiting orbit, waits there for the RAANs and
+then the mean anomalies to match, and transfers on to the target. The waiting
+radius and the split of the plane change between before and after waiting
+(which sets the inclination, so the precession rate, while waiting) are chosen
+to minimize the transfer time within the per-catch dv budget: first on a grid,
+then by golden section search over the radius and then the split around the
+best grid point, for every pair at once
+"""
+import math
+from typing import NamedTuple
+import numpy as np
+import lib
+import constants
+
+
+GRID_RADII = 24
+GRID_SPLITS = 5
+ITERATIONS = 16 # golden section steps per refined variable, each shrinks the bracket by 0.618
+SPAN = 300_000 # m, waiting radii searched below the lower periapsis and above the higher apoapsis
+LOWEST_ALTITUDE = 200_000 # m, waiting orbits below this decay too fast
+
+INVERSE_GOLDEN_RATIO = (math.sqrt(5) - 1) / 2
+
+
+class PhasingResult(NamedTuple):
+    dv: np.ndarray # m/s
+    dt: np.ndarray # s
+    valid: np.ndarray # finite and within the budget
+    radius: np.ndarray # m, of the waiting orbit
+    split: np.ndarray # fraction of the plane change made before waiting
+
+
+def waiting_orbit(
+        orbit_1: lib.OrbitArray,
+        inc_1: np.ndarray,
+        orbit_2: lib.OrbitArray,
+        inc_2: np.ndarray,
+        radius: np.ndarray, # m
+        split: np.ndarray
+        ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    dv through a circular waiting orbit, and its nodal precession rate and period
+
+    The part of the plane change made before waiting is made at the slower of
+    orbit_1 and the waiting orbit, the rest at the slower of it and orbit_2
+    """
+    waiting, transfer_dv = _through(orbit_1, orbit_2, radius)
+    plane_change_dv, rate = _plane_change(orbit_1, inc_1, orbit_2, inc_2, waiting, split)
+    return transfer_dv + plane_change_dv, rate, waiting.period
+
+
+def _through(orbit_1: lib.OrbitArray, orbit_2: lib.OrbitArray, radius: np.ndarray) -> tuple[lib.OrbitArray, np.ndarray]:
+    """
+    The waiting orbit and the in-plane dv from orbit_1 to it and on to orbit_2
+    """
+    return lib.OrbitArray(radius), (
+        lib.coaxial_apsides_change_dv(orbit_1.periapsis, orbit_1.apoapsis, radius, radius, orbit_1.gravitational_parameter)
+        + lib.coaxial_apsides_change_dv(radius, radius, orbit_2.periapsis, orbit_2.apoapsis, orbit_2.gravitational_parameter))
+
+
+def _plane_change(
+        orbit_1: lib.OrbitArray,
+        inc_1: np.ndarray,
+        orbit_2: lib.OrbitArray,
+        inc_2: np.ndarray,
+        waiting: lib.OrbitArray,
+        split: np.ndarray
+        ) -> tuple[np.ndarray, np.ndarray]:
+    """
+    dv of the split plane change, and the precession rate while waiting
+    """
+    inc_delta = np.abs(inc_2 - inc_1)
+    velocity = waiting.periapsis_velocity
+    before = 2 * np.minimum(orbit_1.periapsis_velocity, velocity) * np.sin(np.radians(split * inc_delta) / 2)
+    after = 2 * np.minimum(velocity, orbit_2.periapsis_velocity) * np.sin(np.radians((1 - split) * inc_delta) / 2)
+    return before + after, lib.nodal_precession(inc_1 + split * (inc_2 - inc_1), waiting)
+
+
+def waiting_time(rate: np.ndarray, period: np.ndarray, rate_2: np.ndarray, period_2: np.ndarray, raan_delta: np.ndarray) -> np.ndarray: # s
+    """
+    Time to precess through raan_delta then match mean anomaly, like TransferInvariants.evaluate
+    """
+    precession_rate_delta = rate_2 - rate
+    precess_time = np.where(
+        precession_rate_delta != 0,
+        np.where(precession_rate_delta < 0, raan_delta - 360, raan_delta) / precession_rate_delta,
+        np.inf)
+    return precess_time + period_2**2 / np.abs(period - period_2)
+
+
+def _golden_section(objective, low: np.ndarray, high: np.ndarray, iterations: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Minimizes objective over [low, high] in every lane at once
+
+    Returns the best point evaluated in each lane and its value,
+    so lanes that are not unimodal still keep their best probe
+    """
+    c = high - INVERSE_GOLDEN_RATIO * (high - low)
+    d = low + INVERSE_GOLDEN_RATIO * (high - low)
+    fc, fd = objective(c), objective(d)
+    best = np.where(fc <= fd, c, d)
+    best_value = np.minimum(fc, fd)
+    for _ in range(iterations):
+        left = fc < fd # the minimum is in [low, d]
+        high = np.where(left, d, high)
+        low = np.where(left, low, c)
+        x = np.where(left, high - INVERSE_GOLDEN_RATIO * (high - low), low + INVERSE_GOLDEN_RATIO * (high - low))
+        fx = objective(x)
+        c, fc, d, fd = (
+            np.where(left, x, d), np.where(left, fx, fd),
+            np.where(left, c, x), np.where(left, fc, fx))
+        improved = fx < best_value
+        best = np.where(improved, x, best)
+        best_value = np.where(improved, fx, best_value)
+    return best, best_value
+
+
+def optimize(
+        orbit_1: lib.OrbitArray,
+        inc_1: np.ndarray,
+        raan_1: np.ndarray,
+        orbit_2: lib.OrbitArray,
+        inc_2: np.ndarray,
+        raan_2: np.ndarray,
+        time_offset: float | np.ndarray = 0,
+        per_catch_fuel_budget: float = 100, # m/s
+        radii: int = GRID_RADII,
+        splits: int = GRID_SPLITS,
+        iterations: int = ITERATIONS
+        ) -> PhasingResult:
+    """
+    Fastest waiting orbit of every pair within per_catch_fuel_budget
+
+    Arguments broadcast like catch.transfer_batch, to one axis of pairs
+    """
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        orbit_1, orbit_2 = lib.OrbitArray.broadcast(orbit_1, orbit_2)
+        shape = orbit_1.shape
+        inc_1, inc_2 = np.broadcast_to(inc_1, shape), np.broadcast_to(inc_2, shape)
+        rate_1 = lib.nodal_precession(inc_1, orbit_1)
+        rate_2 = lib.nodal_precession(inc_2, orbit_2)
+        raan_delta = ((raan_1 + rate_1 * time_offset) % 360 - (raan_2 + rate_2 * time_offset) % 360) % 360
+
+        # going through any orbit costs at least the direct change, and splitting a plane change
+        # never makes it cheaper than one burn at the slowest orbit searched
+        highest = np.maximum(orbit_1.apoapsis, orbit_2.apoapsis) + SPAN
+        lower_bound = lib.coaxial_elliptic_orbit_change_dv(orbit_1, orbit_2) + lib.inclination_change_dv(lib.OrbitArray(highest), np.abs(inc_2 - inc_1))
+        result = PhasingResult(
+            np.full(shape, np.inf), np.full(shape, np.inf), np.zeros(shape, dtype=bool), np.full(shape, np.nan), np.full(shape, np.nan))
+        searched = np.flatnonzero(lower_bound <= per_catch_fuel_budget)
+        if not len(searched):
+            return result
+        orbit_1, orbit_2 = orbit_1[searched], orbit_2[searched]
+        inc_1, inc_2, rate_2, raan_delta, highest = inc_1[searched], inc_2[searched], rate_2[searched], raan_delta[searched], highest[searched]
+        period_2 = orbit_2.period
+
+        def cost(radius: np.ndarray, split: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+            dv, rate, period = waiting_orbit(orbit_1, inc_1, orbit_2, inc_2, radius, split)
+            dt = waiting_time(rate, period, rate_2, period_2, raan_delta)
+            return dv, np.where((dv <= per_catch_fuel_budget) & np.isfinite(dv), dt, np.inf)
+
+        lowest = np.maximum(np.minimum(orbit_1.periapsis, orbit_2.periapsis) - SPAN, constants.EARTH_MEAN_RADIUS + LOWEST_ALTITUDE)
+        step = (highest - lowest) / (radii - 1)
+        fractions = np.linspace(0, 1, radii)[:, np.newaxis, np.newaxis]
+        split_grid = np.linspace(0, 1, splits)[np.newaxis, :, np.newaxis]
+
+        # grid, shaped (radii, splits, pairs)
+        _, grid_dt = cost(lowest + fractions * (highest - lowest), split_grid)
+        flat = np.argmin(grid_dt.reshape(radii * splits, -1), axis=0)
+        radius_index, split_index = np.unravel_index(flat, (radii, splits))
+        radius = lowest + radius_index * step
+        split = split_index / (splits - 1)
+        dt = np.take_along_axis(grid_dt.reshape(radii * splits, -1), flat[np.newaxis], axis=0)[0]
+
+        # refine the radius between its grid neighbours, then the split between its own
+        refined, refined_dt = _golden_section(
+            lambda r: cost(r, split)[1],
+            np.maximum(radius - step, lowest), np.minimum(radius + step, highest), iterations)
+        better = refined_dt < dt
+        radius, dt = np.where(better, refined, radius), np.where(better, refined_dt, dt)
+
+        # the in-plane part does not depend on the split
+        waiting, transfer_dv = _through(orbit_1, orbit_2, radius)
+        period = waiting.period
+
+        def split_time(split: np.ndarray) -> np.ndarray:
+            plane_change_dv, rate = _plane_change(orbit_1, inc_1, orbit_2, inc_2, waiting, split)
+            dv = transfer_dv + plane_change_dv
+            return np.where((dv <= per_catch_fuel_budget) & np.isfinite(dv), waiting_time(rate, period, rate_2, period_2, raan_delta), np.inf)
+
+        split_step = 1 / (splits - 1)
+        refined, refined_dt = _golden_section(
+            split_time, np.maximum(split - split_step, 0), np.minimum(split + split_step, 1), iterations)
+        better = refined_dt < dt
+        split, dt = np.where(better, refined, split), np.where(better, refined_dt, dt)
+
+        dv, _ = cost(radius, split)
+        for field, values in zip(result, (dv, dt, np.isfinite(dt), radius, split)):
+            field[searched] = values
+        return result
+
+
+def improve(
+        object_1: dict,
+        candidates,
+        time_offset: float,
+        per_catch_fuel_budget: float,
+        dv: np.ndarray,
+        dt: np.ndarray,
+        valid: np.ndarray
+        ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Replaces the heuristic dv and dt from object_1 to each candidate (a Catalog)
+    with the searched phasing orbit's where that one is faster, or the heuristic one is invalid
+    """
+    result = optimize(
+        lib.OrbitArray.from_dicts([object_1]),
+        float(object_1['INCLINATION']),
+        float(object_1['RA_OF_ASC_NODE']),
+        candidates.orbits,
+        candidates['INCLINATION'],
+        candidates['RA_OF_ASC_NODE'],
+        time_offset,
+        per_catch_fuel_budget)
+    use = result.valid & (~valid | (result.dt < dt))
+    return np.where(use, result.dv, dv), np.where(use, result.dt, dt), valid | result.valid
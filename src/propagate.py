@@ -0,0 +1,101 @@
+"""
+Secular J2 propagation of a whole catalog to common target times
+
+Only RAAN, argument of periapsis and mean anomaly drift under J2,
+so the shape of every orbit is left as it is
+"""
+from collections import OrderedDict
+import numpy as np
+import lib
+from catalog import Catalog
+
+
+# angle columns that are propagated, in the order of the first axis of Propagator arrays
+ELEMENTS = ('RA_OF_ASC_NODE', 'ARG_OF_PERICENTER', 'MEAN_ANOMALY')
+
+
+def as_time(target) -> np.datetime64:
+    """
+    ISO 8601 string or datetime64, at the catalog's EPOCH resolution
+    """
+    return np.datetime64(target, 'us')
+
+
+class Propagator:
+    """
+    Element rates of every object in a catalog, for propagating them all at once
+
+    Results of propagate_to are cached per target time in a small LRU
+    """
+    __slots__ = 'catalog', 'epochs', 'elements', 'rates', 'maxsize', 'cache'
+
+    def __init__(self, catalog: Catalog, maxsize: int = 8):
+        self.catalog = catalog
+        self.epochs = np.asarray(catalog['EPOCH'], dtype='datetime64[us]')
+        self.elements = np.stack([np.asarray(catalog[element], dtype=np.float64) for element in ELEMENTS]) # deg
+        inclination = catalog['INCLINATION']
+        self.rates = np.stack([
+            lib.nodal_precession(inclination, catalog.orbits),
+            lib.apsidal_precession(inclination, catalog.orbits),
+            lib.mean_anomaly_rate(inclination, catalog.orbits)]) # deg/s
+        self.maxsize = maxsize
+        self.cache: OrderedDict[np.datetime64, np.ndarray] = OrderedDict()
+
+    def elapsed(self, targets) -> np.ndarray: # s
+        """
+        Time from each object's EPOCH to each target, shaped targets.shape + (len(catalog),)
+        """
+        targets = np.asarray(targets, dtype='datetime64[us]')
+        return (targets[..., np.newaxis] - self.epochs) / np.timedelta64(1, 's')
+
+    def propagate(self, targets, out: np.ndarray | None = None) -> np.ndarray: # deg
+        """
+        Elements of every object at every target time
+
+        Shaped (len(ELEMENTS),) + targets.shape + (len(catalog),), written into out if given
+        """
+        elapsed = self.elapsed(targets)
+        if out is None:
+            out = np.empty((len(ELEMENTS),) + elapsed.shape)
+        # add the time axes between the element axis and the catalog axis
+        expand = (slice(None),) + (np.newaxis,) * (elapsed.ndim - 1)
+        np.multiply(self.rates[expand], elapsed, out=out)
+        out += self.elements[expand]
+        np.remainder(out, 360, out=out)
+        return out
+
+    def propagate_to(self, target) -> np.ndarray: # deg
+        """
+        Cached propagate for one target time, the result is read only
+        """
+        target = as_time(target)
+        if target in self.cache:
+            self.cache.move_to_end(target)
+            return self.cache[target]
+        elements = self.propagate(target)
+        elements.setflags(write=False)
+        self.cache[target] = elements
+        if len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+        return elements
+
+    def catalog_at(self, target) -> Catalog:
+        """
+        The catalog with every object's elements and EPOCH moved to target
+        """
+        target = as_time(target)
+        columns = dict(self.catalog.columns)
+        for element, values in zip(ELEMENTS, self.propagate_to(target)):
+            columns[element] = values
+        columns['EPOCH'] = np.full(len(self.catalog), target)
+        return Catalog(columns)
+
+
+def to_epoch(catalog: Catalog, target='latest') -> Catalog:
+    """
+    Propagates catalog to target, by default its newest EPOCH
+    """
+    if isinstance(target, str) and target == 'latest':
+        epochs = catalog['EPOCH']
+        target = epochs[~np.isnat(epochs)].max()
+    return Propagator(catalog, maxsize=1).catalog_at(target)
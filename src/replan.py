@@ -0,0 +1,235 @@
+"""
+Incremental re-planning of stored routes after the catalog is refreshed
+
+Objects are matched between the old and new catalogs by NORAD_CAT_ID.
+A leg keeps its stored dv and dt while neither end moved beyond the tolerance
+and every leg before it was kept, otherwise it is re-evaluated on the new catalog.
+The route is only re-planned, greedily like collect, from the first leg that is
+no longer one collect could take
+"""
+import math
+import time
+from typing import NamedTuple
+import numpy as np
+import lib
+import catch
+import pareto
+import store
+from candidates import CandidateIndex
+from catalog import Catalog
+
+
+class Tolerance(NamedTuple):
+    """
+    Element changes at or below these leave an object unchanged
+    """
+    semimajor_axis: float = 0.01 # km
+    eccentricity: float = 1e-6 # unitless
+    inclination: float = 1e-4 # deg
+    raan: float = 1e-4 # deg
+
+
+class CatalogDiff(NamedTuple):
+    changed: set[int] # NORAD_CAT_IDs in both catalogs whose elements moved beyond the tolerance
+    removed: set[int]
+    added: set[int]
+
+
+class Replan(NamedTuple):
+    start: int # position of the start object in the new catalog
+    caught: list[dict] # records from the new catalog, start first
+    dv: float # m/s
+    time: float # s
+    metadata: list[tuple[float, float, int]] # like collect's, positions in the new catalog
+    kept: int # legs kept as stored
+    reevaluated: int # legs evaluated again on the new catalog and still feasible
+    replanned_from: int | None # first leg re-planned by collect_one, None if the route stood
+
+
+def diff(old: Catalog, new: Catalog, tolerance: Tolerance = Tolerance()) -> CatalogDiff:
+    old_ids = np.asarray(old['NORAD_CAT_ID'])
+    new_ids = np.asarray(new['NORAD_CAT_ID'])
+    common, old_at, new_at = np.intersect1d(old_ids, new_ids, assume_unique=False, return_indices=True)
+    moved = np.zeros(len(common), dtype=bool)
+    for field, limit in zip(('SEMIMAJOR_AXIS', 'ECCENTRICITY', 'INCLINATION', 'RA_OF_ASC_NODE'), tolerance):
+        delta = np.abs(np.asarray(new[field])[new_at] - np.asarray(old[field])[old_at])
+        if field == 'RA_OF_ASC_NODE':
+            delta = np.minimum(delta % 360, 360 - delta % 360)
+        # nan compares false, so a lost element counts as changed
+        moved |= ~(delta <= limit)
+    return CatalogDiff(
+        set(common[moved].tolist()),
+        set(np.setdiff1d(old_ids, new_ids).tolist()),
+        set(np.setdiff1d(new_ids, old_ids).tolist()))
+
+
+def _leg(
+        objects: Catalog,
+        index: CandidateIndex,
+        start: int,
+        current: dict,
+        position: int,
+        per_catch_fuel_budget: float,
+        per_catch_time_target: float,
+        current_time: float
+        ) -> tuple[float, float] | None:
+    """
+    dv and dt from current to the object at position, or None if collect could not take it
+
+    That is when the object is not after start, its inclination change alone
+    exceeds the budget, the transfer is degenerate or it misses the time target
+    """
+    if position <= start:
+        return None
+    target = objects[position]
+    if abs(float(target['INCLINATION']) - float(current['INCLINATION'])) > index.inclination_window(current, per_catch_fuel_budget):
+        return None
+    try:
+        dv, dt = catch.resources_to_transfer(current, target, current_time, per_catch_fuel_budget)
+    except ZeroDivisionError:
+        return None
+    if not (np.isfinite(dv) and np.isfinite(dt) and dt < per_catch_time_target):
+        return None
+    return dv, dt
+
+
+def replan(
+        route: list[dict],
+        metadata: list[tuple[float, float, int]],
+        objects: Catalog,
+        changes: CatalogDiff,
+        per_catch_fuel_budget: float,
+        per_catch_time_target: float,
+        total_fuel_budget: float,
+        choose: str | pareto.Chooser = 'first',
+        index: CandidateIndex | None = None,
+        cache: catch.TransferCache | None = None
+        ) -> Replan:
+    """
+    Brings a route from collect (caught and metadata) over to objects, the new catalog
+
+    changes is the diff from the catalog the route was planned on to objects.
+    Raises KeyError if the start object is no longer in objects
+    """
+    index = index if index is not None else CandidateIndex(objects)
+    cache = cache if cache is not None else catch.TransferCache(objects)
+    ids = np.asarray(objects['NORAD_CAT_ID'])
+    order = np.argsort(ids, kind='stable')
+
+    def position_of(norad_cat_id: int) -> int | None:
+        found = np.searchsorted(ids, norad_cat_id, sorter=order)
+        if found < len(ids) and ids[order[found]] == norad_cat_id:
+            return int(order[found])
+        return None
+
+    start = position_of(int(route[0]['NORAD_CAT_ID']))
+    if start is None:
+        raise KeyError(f'start object {route[0]["NORAD_CAT_ID"]} is not in the new catalog')
+    caught = [objects[start]]
+    index.caught.clear()
+    index.mark_caught(int(caught[0]['NORAD_CAT_ID']))
+    v = t = 0
+    new_metadata = []
+    kept = reevaluated = 0
+    replanned_from = None
+    shifted = False # whether legs now start at a different time than stored
+
+    for leg, (obj, (dv, dt, _)) in enumerate(zip(route[1:], metadata)):
+        if v >= total_fuel_budget:
+            break
+        norad_cat_id = int(obj['NORAD_CAT_ID'])
+        position = position_of(norad_cat_id)
+        if position is None:
+            replanned_from = leg
+            break
+        if shifted or int(caught[-1]['NORAD_CAT_ID']) in changes.changed or norad_cat_id in changes.changed:
+            result = _leg(objects, index, start, caught[-1], position, per_catch_fuel_budget, per_catch_time_target, t)
+            if result is None:
+                replanned_from = leg
+                break
+            # the scalar and batch transfer costs differ in the last bits
+            shifted = shifted or not math.isclose(result[1], dt, rel_tol=1e-9)
+            dv, dt = result
+            reevaluated += 1
+        else:
+            kept += 1
+        v += dv
+        t += dt
+        caught.append(objects[position])
+        index.mark_caught(norad_cat_id)
+        new_metadata.append((dv, dt, position))
+
+    # like collect, carry on while there is budget left. If the route stood with
+    # its last object and times unchanged, it ended because nothing was feasible,
+    # and only changed or added objects can have become feasible since
+    extended_from = len(new_metadata)
+    stood = replanned_from is None and not shifted and int(caught[-1]['NORAD_CAT_ID']) not in changes.changed
+    if stood and v < total_fuel_budget:
+        candidates = index.candidates(caught[-1], start, per_catch_fuel_budget)
+        touched = np.isin(ids[candidates], list(changes.changed | changes.added))
+        if not touched.any():
+            return Replan(start, caught, v, t, new_metadata, kept, reevaluated, None)
+    while v < total_fuel_budget:
+        try:
+            catch_, dv, dt, position = catch.collect_one(
+                objects, caught, start, per_catch_fuel_budget, per_catch_time_target, t,
+                catalog=objects, choose=choose, index=index, cache=cache)
+        except ValueError:
+            break
+        v += dv
+        t += dt
+        caught.append(catch_)
+        index.mark_caught(int(catch_['NORAD_CAT_ID']))
+        new_metadata.append((dv, dt, position))
+    if replanned_from is None and len(new_metadata) > extended_from:
+        replanned_from = extended_from
+    return Replan(start, caught, v, t, new_metadata, kept, reevaluated, replanned_from)
+
+
+def main(
+        old_objects: Catalog,
+        objects: Catalog,
+        per_catch_fuel_budget: float,
+        per_catch_time_target: float,
+        total_fuel_budget: float,
+        results_store: store.ResultStore,
+        tolerance: Tolerance = Tolerance()):
+    """
+    Re-plans every run stored for old_objects onto objects and stores the results for objects
+
+    They are stored under the replanned params key, apart from collect's runs,
+    as kept legs need not be the ones collect would choose on objects.
+    Routes replanned onto old_objects carry on, unless collect was run from their start since
+    """
+    params = store.params_key(per_catch_fuel_budget, per_catch_time_target, total_fuel_budget)
+    replanned_params = store.params_key(per_catch_fuel_budget, per_catch_time_target, total_fuel_budget, replanned=True)
+    old_key = old_objects.digest()
+    runs = {run.start: run for run in results_store.runs(old_key, replanned_params)}
+    runs.update((run.start, run) for run in results_store.runs(old_key, params))
+    runs = list(runs.values())
+    if not runs:
+        print('no stored runs for the old catalog and these budgets')
+        return
+    began = time.perf_counter()
+    changes = diff(old_objects, objects, tolerance)
+    print(f'{len(changes.changed)} objects changed, {len(changes.removed)} removed, {len(changes.added)} added')
+
+    catalog_key = objects.digest()
+    index = CandidateIndex(objects)
+    cache = catch.TransferCache(objects)
+    stood = kept = reevaluated = replanned = lost = 0
+    for run in runs:
+        caught, _, _, meta = store.to_collect(old_objects, run)
+        try:
+            result = replan(caught, meta, objects, changes, per_catch_fuel_budget, per_catch_time_target, total_fuel_budget, index=index, cache=cache)
+        except KeyError:
+            lost += 1
+            continue
+        stood += result.replanned_from is None
+        replanned += result.replanned_from is not None
+        kept += result.kept
+        reevaluated += result.reevaluated
+        results_store.put(catalog_key, replanned_params, store.to_run(
+            objects, result.start, result.dv, result.time, result.metadata, catch.deorbit_dv(lib.Orbit2d.from_dict(result.caught[-1]))))
+    print(f'{len(runs)} routes in {time.perf_counter() - began:.2f} s: {stood} stood, {replanned} re-planned, {lost} lost their start object')
+    print(f'{kept} legs kept, {reevaluated} re-evaluated')
@@ -0,0 +1,250 @@
+"""
+Planner service keeping the catalog loaded, filtered and indexed between queries
+
+Requests and responses are JSON lines over TCP or a Unix socket:
+  {"id": 1, "method": "collect", "params": {"start": 0}}
+  {"id": 1, "version": 1, "result": {...}}
+
+Methods are status, reload, resources_to_transfer, deorbit_dv, collect and beam.
+Objects are given by position in the planning order (like catch.py START)
+or by NORAD_CAT_ID with the _id suffix, e.g. {"from_id": 25544}.
+collect and beam run in a worker pool, the rest are answered directly.
+The catalog file is watched and reloaded in the background,
+requests already running finish on the catalog they started with
+
+  py server.py [--port 8765 | --unix PATH] [--catalog PATH] [--workers N]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+import numpy as np
+import lib
+import catch
+import beam
+import sweep
+from candidates import CandidateIndex
+from catalog import Catalog, load as load_catalog
+
+
+class Snapshot(NamedTuple):
+    """
+    One loaded version of the catalog and the worker pool planning over it
+    """
+    version: int
+    mtime_ns: int
+    objects: Catalog
+    pool: ProcessPoolExecutor
+
+
+# the snapshot's catalog, index and cache, set in each of its pool's workers by _init_worker
+_objects: Catalog | None = None
+_index: CandidateIndex | None = None
+_cache: catch.TransferCache | None = None
+
+
+def _init_worker(objects: Catalog):
+    global _objects, _index, _cache
+    _objects = objects
+    _index = CandidateIndex(objects)
+    _cache = catch.TransferCache(objects)
+
+
+def _plan(method: str, start: int, params: dict) -> dict:
+    budgets = (
+        params.get('per_catch_fuel_budget', catch.PER_CATCH_FUEL_BUDGET),
+        params.get('per_catch_time_target', catch.PER_CATCH_TIME_BUDGET),
+        params.get('total_fuel_budget', catch.TOTAL_FUEL_BUDGET))
+    if method == 'collect':
+        caught, v, t, meta = catch.collect(
+            _objects, start, *budgets, choose=params.get('choose', 'first'),
+            index=_index, cache=_cache, start_time=params.get('start_time', 0))
+    else:
+        caught, v, t, meta = beam.beam_search(
+            _objects, start, *budgets,
+            beam_width=params.get('beam_width', 8), branching=params.get('branching', 4),
+            time_limit=params.get('time_limit', 10), objective=params.get('objective', 'dv'),
+            index=_index, cache=_cache)
+    return {
+        'caught': [int(obj['NORAD_CAT_ID']) for obj in caught],
+        'positions': [start] + [position for _, _, position in meta],
+        'legs': [{'dv': dv, 'dt': dt} for dv, dt, _ in meta],
+        'dv': v,
+        'time': t,
+        'deorbit_dv': catch.deorbit_dv(lib.Orbit2d.from_dict(caught[-1])),
+    }
+
+
+def _position(objects: Catalog, params: dict, name: str) -> int:
+    """
+    Position of the object given as params[name], or by NORAD_CAT_ID as params[name + '_id']
+    """
+    if name + '_id' in params:
+        found = np.flatnonzero(objects['NORAD_CAT_ID'] == int(params[name + '_id']))
+        if not len(found):
+            raise KeyError(f'no object with NORAD_CAT_ID {params[name + "_id"]}')
+        return int(found[0])
+    position = int(params[name])
+    if not 0 <= position < len(objects):
+        raise IndexError(f'{name} must be between 0 and {len(objects) - 1}')
+    return position
+
+
+class PlannerServer:
+    __slots__ = 'path', 'workers', 'poll_interval', 'snapshot', 'in_flight', 'reloading'
+
+    def __init__(self, path: str, workers: int | None = None, poll_interval: float = 2): # s
+        self.path = path
+        self.workers = workers or os.cpu_count() or 1
+        self.poll_interval = poll_interval
+        self.snapshot: Snapshot | None = None
+        self.in_flight = 0
+        self.reloading = asyncio.Lock()
+
+    def load(self, version: int) -> Snapshot:
+        # stat first, so a change while loading is picked up by the next poll
+        mtime_ns = os.stat(self.path).st_mtime_ns
+        objects = catch.planning_objects(load_catalog(self.path))
+        pool = sweep.executor(self.workers, _init_worker, (objects,))
+        return Snapshot(version, mtime_ns, objects, pool)
+
+    async def reload(self, force: bool = False) -> bool:
+        """
+        Swaps in a new snapshot if the catalog file changed
+
+        The old pool is shut down without waiting, which lets its running requests finish
+        """
+        async with self.reloading:
+            previous = self.snapshot
+            if previous is not None and not force and os.stat(self.path).st_mtime_ns == previous.mtime_ns:
+                return False
+            self.snapshot = await asyncio.to_thread(self.load, 1 if previous is None else previous.version + 1)
+        if previous is not None:
+            previous.pool.shutdown(wait=False)
+        return True
+
+    async def watch(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                if await self.reload():
+                    print(f'reloaded {self.path} as version {self.snapshot.version}, {len(self.snapshot.objects)} objects')
+            except (OSError, ValueError) as e:
+                # a half written file, keep serving the old snapshot and retry next poll
+                print(f'reload failed: {e}')
+
+    async def handle(self, method: str, params: dict) -> tuple[int, dict]:
+        """
+        Answers one request, returning the catalog version used and the result
+        """
+        if method == 'reload':
+            reloaded = await self.reload(force=params.get('force', False))
+            return self.snapshot.version, {'reloaded': reloaded}
+
+        snapshot = self.snapshot
+        objects = snapshot.objects
+        if method == 'status':
+            return snapshot.version, {'path': self.path, 'objects': len(objects), 'in_flight': self.in_flight, 'workers': self.workers}
+        if method == 'deorbit_dv':
+            return snapshot.version, {'dv': catch.deorbit_dv(lib.Orbit2d.from_dict(objects[_position(objects, params, 'position')]))}
+        if method == 'resources_to_transfer':
+            try:
+                dv, dt = catch.resources_to_transfer(
+                    objects[_position(objects, params, 'from')],
+                    objects[_position(objects, params, 'to')],
+                    params.get('time_offset', 0),
+                    params.get('extra_budget', catch.PER_CATCH_FUEL_BUDGET))
+            except ZeroDivisionError:
+                raise ValueError('degenerate transfer')
+            return snapshot.version, {'dv': dv, 'dt': dt}
+        if method in ('collect', 'beam'):
+            start = _position(objects, params, 'start')
+            result = await asyncio.wrap_future(snapshot.pool.submit(_plan, method, start, params))
+            return snapshot.version, result
+        raise ValueError(f'unknown method {method!r}')
+
+    async def respond(self, line: bytes, writer: asyncio.StreamWriter, lock: asyncio.Lock):
+        self.in_flight += 1
+        response = {}
+        try:
+            request = json.loads(line)
+            response['id'] = request.get('id')
+            response['version'], response['result'] = await self.handle(request['method'], request.get('params', {}))
+        except Exception as e:
+            response['error'] = f'{type(e).__name__}: {e}'
+        finally:
+            self.in_flight -= 1
+        async with lock:
+            writer.write(json.dumps(response).encode('UTF-8') + b'\n')
+            await writer.drain()
+
+    async def connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Requests on one connection run concurrently, responses carry the request id
+        """
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while line := await reader.readline():
+                if line.strip():
+                    task = asyncio.create_task(self.respond(line, writer, lock))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = 'localhost', port: int = 8765, unix: str | None = None, ready: asyncio.Event | None = None):
+        await self.reload()
+        if unix is not None:
+            server = await asyncio.start_unix_server(self.connection, unix)
+        else:
+            server = await asyncio.start_server(self.connection, host, port)
+        print(f'serving {len(self.snapshot.objects)} objects on {unix or server.sockets[0].getsockname()}')
+        watcher = asyncio.create_task(self.watch())
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+            self.snapshot.pool.shutdown()
+
+
+def request(address: tuple[str, int] | str, method: str, **params) -> dict:
+    """
+    Sends one request and waits for its response, address is (host, port) or a Unix socket path
+    """
+    family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+    with socket.socket(family, socket.SOCK_STREAM) as connection:
+        connection.connect(address)
+        connection.sendall(json.dumps({'id': 0, 'method': method, 'params': params}).encode('UTF-8') + b'\n')
+        with connection.makefile('rb') as file:
+            return json.loads(file.readline())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve planner queries over a loaded catalog')
+    parser.add_argument('--catalog', help='catalog JSON, leo_debris.json.gz or leo_debris.json in ../data by default')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help='listen on this Unix socket path instead of TCP')
+    parser.add_argument('--workers', type=int, help='processes for collect and beam, all cores by default')
+    parser.add_argument('--poll-interval', type=float, default=2, help='seconds between checks for a changed catalog')
+    args = parser.parse_args()
+
+    path = args.catalog or next((path for path in catch.CATALOG_PATHS if os.path.exists(path)), None)
+    if path is None:
+        print('leo_debris.json.gz not found, ensure you have run get.py')
+        exit(1)
+    try:
+        asyncio.run(PlannerServer(path, args.workers, args.poll_interval).serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
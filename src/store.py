@@ -0,0 +1,169 @@
+"""
+SQLite store of collect results
+
+Runs are keyed by the planning catalog's content hash, the start index
+and the planner parameters, so a repeated run is read back instead of recomputed
+"""
+import json
+import os
+import sqlite3
+from typing import Iterable, NamedTuple
+from catalog import Catalog
+
+
+STORE_PATH = '../data/results.sqlite'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    catalog TEXT NOT NULL,
+    params TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    caught INTEGER NOT NULL,
+    dv REAL NOT NULL,
+    time REAL NOT NULL,
+    deorbit_dv REAL NOT NULL,
+    total_dv REAL NOT NULL,
+    route TEXT NOT NULL,
+    UNIQUE (catalog, params, start)
+);
+CREATE TABLE IF NOT EXISTS legs (
+    run INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    leg INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    dv REAL NOT NULL,
+    dt REAL NOT NULL,
+    PRIMARY KEY (run, leg)
+);
+CREATE INDEX IF NOT EXISTS runs_total_dv ON runs (catalog, params, total_dv);
+'''
+
+
+class StoredRun(NamedTuple):
+    start: int
+    caught: int # objects caught after the start object
+    dv: float # m/s
+    time: float # s
+    deorbit_dv: float # m/s
+    route: list[int] # NORAD_CAT_IDs, start first
+    legs: list[tuple[float, float, int]] # dv, dt and position of each catch, like collect's metadata
+
+    @property
+    def total_dv(self) -> float: # m/s
+        return self.dv + self.deorbit_dv
+
+    @property
+    def positions(self) -> list[int]:
+        return [self.start] + [position for _, _, position in self.legs]
+
+
+def params_key(
+        per_catch_fuel_budget: float,
+        per_catch_time_target: float,
+        total_fuel_budget: float,
+        choose: str = 'first',
+        optimize_phasing: bool = False,
+        replanned: bool = False) -> str:
+    """
+    Canonical JSON of the planner parameters
+
+    replanned keys routes carried over from an earlier catalog by replan, which
+    can differ from what collect plans on this one. Both flags are only included
+    when set, so keys stored before they existed still match
+    """
+    params = {
+        'per_catch_fuel_budget': float(per_catch_fuel_budget),
+        'per_catch_time_target': float(per_catch_time_target),
+        'total_fuel_budget': float(total_fuel_budget),
+        'choose': choose,
+    }
+    if optimize_phasing:
+        params['optimize_phasing'] = True
+    if replanned:
+        params['replanned'] = True
+    return json.dumps(params, sort_keys=True)
+
+
+class ResultStore:
+    __slots__ = 'path', 'connection'
+
+    def __init__(self, path: str = STORE_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _run(self, row: tuple) -> StoredRun:
+        run_id, start, caught, dv, time, deorbit_dv, route = row
+        legs = self.connection.execute('SELECT dv, dt, position FROM legs WHERE run = ? ORDER BY leg', (run_id,)).fetchall()
+        return StoredRun(start, caught, dv, time, deorbit_dv, json.loads(route), legs)
+
+    def get(self, catalog: str, params: str, start: int) -> StoredRun | None:
+        row = self.connection.execute(
+            'SELECT id, start, caught, dv, time, deorbit_dv, route FROM runs WHERE catalog = ? AND params = ? AND start = ?',
+            (catalog, params, start)).fetchone()
+        return None if row is None else self._run(row)
+
+    def put(self, catalog: str, params: str, run: StoredRun):
+        """
+        Stores a run, replacing any earlier one with the same key
+        """
+        with self.connection:
+            self.connection.execute('DELETE FROM runs WHERE catalog = ? AND params = ? AND start = ?', (catalog, params, run.start))
+            run_id = self.connection.execute(
+                'INSERT INTO runs (catalog, params, start, caught, dv, time, deorbit_dv, total_dv, route) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (catalog, params, run.start, run.caught, run.dv, run.time, run.deorbit_dv, run.total_dv, json.dumps(run.route))).lastrowid
+            self.connection.executemany(
+                'INSERT INTO legs (run, leg, position, dv, dt) VALUES (?, ?, ?, ?, ?)',
+                [(run_id, leg, position, dv, dt) for leg, (dv, dt, position) in enumerate(run.legs)])
+
+    def completed(self, catalog: str, params: str) -> set[int]:
+        return {start for start, in self.connection.execute('SELECT start FROM runs WHERE catalog = ? AND params = ?', (catalog, params))}
+
+    def runs(self, catalog: str, params: str) -> list[StoredRun]:
+        """
+        Every run stored for this catalog and these parameters, by start
+        """
+        rows = self.connection.execute(
+            'SELECT id, start, caught, dv, time, deorbit_dv, route FROM runs WHERE catalog = ? AND params = ? ORDER BY start',
+            (catalog, params)).fetchall()
+        return [self._run(row) for row in rows]
+
+    def best(self, catalog: str, params: str, max_total_dv: float = float('inf'), limit: int = 20) -> list[StoredRun]:
+        """
+        Runs under max_total_dv, most objects caught first, then least total dv
+        """
+        rows = self.connection.execute(
+            'SELECT id, start, caught, dv, time, deorbit_dv, route FROM runs'
+            ' WHERE catalog = ? AND params = ? AND total_dv <= ?'
+            ' ORDER BY caught DESC, total_dv, time LIMIT ?',
+            (catalog, params, max_total_dv, limit)).fetchall()
+        return [self._run(row) for row in rows]
+
+
+def to_run(objects: Catalog, start: int, v: float, t: float, meta: Iterable[tuple[float, float, int]], deorbit_dv: float) -> StoredRun:
+    """
+    A run from collect's results over objects
+    """
+    legs = [(dv, dt, int(position)) for dv, dt, position in meta]
+    route = objects['NORAD_CAT_ID'][[start] + [position for _, _, position in legs]].tolist()
+    return StoredRun(start, len(legs), v, t, deorbit_dv, route, legs)
+
+
+def to_collect(objects: Catalog, run: StoredRun) -> tuple[list[dict], float, float, list[tuple[float, float, int]]]:
+    """
+    A stored run in the form collect returns it
+    """
+    return [objects[position] for position in run.positions], run.dv, run.time, list(run.legs)
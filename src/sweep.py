@@ -0,0 +1,133 @@
+import multiprocessing
+import multiprocessing.pool
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, NamedTuple
+import lib
+import catch
+import store
+from candidates import CandidateIndex
+from catalog import Catalog
+
+
+class SweepResult(NamedTuple):
+    start: int
+    caught: int # objects caught after the start object
+    dv: float # m/s
+    time: float # s
+    deorbit_dv: float # m/s
+    legs: tuple[tuple[float, float, int], ...] = () # collect's metadata
+
+    @property
+    def total_dv(self) -> float: # m/s
+        return self.dv + self.deorbit_dv
+
+
+def _context() -> multiprocessing.context.BaseContext:
+    """
+    Forks where the platform can, so initializer arguments are inherited rather than pickled
+    """
+    return multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+
+
+def pool(processes: int | None, initializer: Callable, initargs: tuple) -> multiprocessing.pool.Pool:
+    """
+    Process pool whose workers are set up by initializer(*initargs), one per core by default
+    """
+    return _context().Pool(processes or os.cpu_count() or 1, initializer=initializer, initargs=initargs)
+
+
+def executor(processes: int | None, initializer: Callable, initargs: tuple) -> ProcessPoolExecutor:
+    """
+    Like pool, as a concurrent.futures executor for asyncio
+    """
+    return ProcessPoolExecutor(processes or os.cpu_count() or 1, mp_context=_context(), initializer=initializer, initargs=initargs)
+
+
+# set in each worker by _init_worker
+_objects: Catalog | None = None
+_index: CandidateIndex | None = None
+_cache: catch.TransferCache | None = None
+
+
+def _init_worker(objects: Catalog):
+    global _objects, _index, _cache
+    _objects = objects
+    _index = CandidateIndex(objects)
+    _cache = catch.TransferCache(objects)
+
+
+def _run(args: tuple[int, float, float, float, bool]) -> SweepResult:
+    start, per_catch_fuel_budget, per_catch_time_target, total_fuel_budget, optimize_phasing = args
+    caught, v, t, meta = catch.collect(
+        _objects, start, per_catch_fuel_budget, per_catch_time_target, total_fuel_budget,
+        index=_index, cache=_cache, optimize_phasing=optimize_phasing)
+    return SweepResult(start, len(caught) - 1, v, t, catch.deorbit_dv(lib.Orbit2d.from_dict(caught[-1])), tuple(meta))
+
+
+def sweep(
+        objects: Catalog,
+        starts: Iterable[int],
+        per_catch_fuel_budget: float,
+        per_catch_time_target: float,
+        total_fuel_budget: float,
+        processes: int | None = None,
+        optimize_phasing: bool = False
+        ) -> Iterator[SweepResult]:
+    """
+    Runs collect from every start index across a process pool
+
+    The catalog is handed to each worker once, and each worker keeps
+    its candidate index and transfer cache across starts.
+    Results are yielded in completion order
+    """
+    tasks = [(start, per_catch_fuel_budget, per_catch_time_target, total_fuel_budget, optimize_phasing) for start in starts]
+    processes = processes or os.cpu_count() or 1
+    with pool(processes, _init_worker, (objects,)) as workers:
+        yield from workers.imap_unordered(_run, tasks, chunksize=max(1, len(tasks) // (processes * 8)))
+
+
+def rank(results: Iterable[SweepResult]) -> list[SweepResult]:
+    """
+    Most objects caught first, then least total dv
+    """
+    return sorted(results, key=lambda result: (-result.caught, result.total_dv, result.time))
+
+
+def main(
+        objects: Catalog,
+        starts: Iterable[int],
+        per_catch_fuel_budget: float,
+        per_catch_time_target: float,
+        total_fuel_budget: float,
+        top: int = 20,
+        results_store: store.ResultStore | None = None,
+        optimize_phasing: bool = False):
+    """
+    With a results_store, starts already stored for this catalog and these
+    parameters are read back instead of run, and new results are stored as they arrive
+    """
+    results = []
+    starts = list(starts)
+    if results_store is not None:
+        catalog = objects.digest()
+        params = store.params_key(per_catch_fuel_budget, per_catch_time_target, total_fuel_budget, optimize_phasing=optimize_phasing)
+        done = results_store.completed(catalog, params)
+        for start in starts:
+            if start in done:
+                run = results_store.get(catalog, params, start)
+                results.append(SweepResult(run.start, run.caught, run.dv, run.time, run.deorbit_dv, tuple(run.legs)))
+        starts = [start for start in starts if start not in done]
+        if results:
+            print(f'{len(results)} starts already stored, running {len(starts)}')
+
+    total = len(results) + len(starts)
+    for result in sweep(objects, starts, per_catch_fuel_budget, per_catch_time_target, total_fuel_budget, optimize_phasing=optimize_phasing) if starts else ():
+        results.append(result)
+        if results_store is not None:
+            results_store.put(catalog, params, store.to_run(objects, result.start, result.dv, result.time, result.legs, result.deorbit_dv))
+        print(f'[{len(results)}/{total}] {result.start:5}: {result.caught:3} caught, {result.total_dv:5.0f} m/s, {result.time/60/60/24/365:5.2f} years')
+
+    print(f'best {min(top, len(results))} of {len(results)} starts:')
+    for result in rank(results)[:top]:
+        print(f'{result.start:5}: {result.caught:3} caught, {result.dv:5.0f} + {result.deorbit_dv:4.0f} = {result.total_dv:5.0f} m/s, {result.time/60/60/24/365:5.2f} years')
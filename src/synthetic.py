@@ -0,0 +1,80 @@
+import numpy as np
+import lib
+import constants
+
+
+# (inclination deg, spread deg, weight) of the debris families in LEO
+INCLINATION_FAMILIES = (
+    (98.0, 1.0, 0.35), # sun-synchronous
+    (82.0, 1.0, 0.12),
+    (74.0, 1.0, 0.12),
+    (71.0, 0.5, 0.05),
+    (65.0, 1.0, 0.08),
+    (51.6, 0.5, 0.08),
+    (86.4, 0.2, 0.05), # iridium
+)
+
+
+def generate(count: int, seed: int = 0) -> list[dict]:
+    """
+    Seeded synthetic catalog of space-track shaped GP records
+
+    Fields are strings like the real download, mean motions fall within
+    the range get.py queries, and inclinations cluster like real LEO debris
+    """
+    rng = np.random.default_rng(seed)
+    earth_radius = constants.EARTH_MEAN_RADIUS / 1000 # km
+
+    # families plus a uniform background
+    family = rng.choice(len(INCLINATION_FAMILIES) + 1, size=count, p=[f[2] for f in INCLINATION_FAMILIES] + [1 - sum(f[2] for f in INCLINATION_FAMILIES)])
+    centers = np.array([f[0] for f in INCLINATION_FAMILIES] + [0])
+    spreads = np.array([f[1] for f in INCLINATION_FAMILIES] + [0])
+    inclination = np.where(
+        family < len(INCLINATION_FAMILIES),
+        rng.normal(centers[family], spreads[family]),
+        rng.uniform(0, 145, count)) % 180
+
+    periapsis = 300 + rng.gamma(2.5, 150, count) # km altitude
+    eccentricity = np.abs(rng.laplace(0, 0.004, count))
+    semimajor_axis = (periapsis + earth_radius) / (1 - eccentricity) # km
+    mean_motion = 86400 / lib.OrbitArray(semimajor_axis * 1000, eccentricity).period # rev/day
+    # stay inside the MEAN_MOTION/12.2--15.6 query
+    keep = (12.2 <= mean_motion) & (mean_motion <= 15.6)
+    while not keep.all():
+        periapsis[~keep] = 300 + rng.gamma(2.5, 150, np.count_nonzero(~keep))
+        semimajor_axis = (periapsis + earth_radius) / (1 - eccentricity)
+        mean_motion = 86400 / lib.OrbitArray(semimajor_axis * 1000, eccentricity).period
+        keep = (12.2 <= mean_motion) & (mean_motion <= 15.6)
+    apoapsis = semimajor_axis * (1 + eccentricity) - earth_radius
+
+    raan = rng.uniform(0, 360, count)
+    arg_of_pericenter = rng.uniform(0, 360, count)
+    mean_anomaly = rng.uniform(0, 360, count)
+    epoch = np.datetime64('2024-01-01T00:00:00', 'us') + rng.integers(0, 30 * 86400 * 10**6, count).astype('timedelta64[us]')
+
+    return [{
+        'NORAD_CAT_ID': str(20000 + i),
+        'OBJECT_NAME': f'SYNTHETIC DEB {i}',
+        'OBJECT_TYPE': 'DEBRIS',
+        'EPOCH': str(epoch[i]),
+        'MEAN_MOTION': f'{mean_motion[i]:.8f}',
+        'ECCENTRICITY': f'{eccentricity[i]:.7f}',
+        'INCLINATION': f'{inclination[i]:.4f}',
+        'RA_OF_ASC_NODE': f'{raan[i]:.4f}',
+        'ARG_OF_PERICENTER': f'{arg_of_pericenter[i]:.4f}',
+        'MEAN_ANOMALY': f'{mean_anomaly[i]:.4f}',
+        'SEMIMAJOR_AXIS': f'{semimajor_axis[i]:.3f}',
+        'PERIOD': f'{1440 / mean_motion[i]:.3f}',
+        'APOAPSIS': f'{apoapsis[i]:.3f}',
+        'PERIAPSIS': f'{periapsis[i]:.3f}',
+    } for i in range(count)]
+
+
+if __name__ == '__main__':
+    import json
+    import sys
+    if len(sys.argv) < 3:
+        print('Usage: py', sys.argv[0], 'COUNT OUTPUT.json [SEED]')
+        exit(1)
+    with open(sys.argv[2], mode='w', encoding='UTF-8') as f:
+        json.dump(generate(int(sys.argv[1]), int(sys.argv[3]) if len(sys.argv) > 3 else 0), f)
@@ -0,0 +1,209 @@
+"""
+Launch window scans, evaluating plans over many start time offsets at once
+
+Each offset is a lane. Lanes at the same current object share one
+TransferInvariants row, evaluated against all of their times together
+"""
+from typing import NamedTuple
+import numpy as np
+import catch
+from candidates import CandidateIndex
+from catalog import Catalog
+
+
+# pairs evaluated at once, groups of lanes are split to stay under this
+CHUNK_CELLS = 2_000_000
+
+# row-wise counterparts of catch.CHOOSERS, one choice per lane
+ROW_CHOOSERS = {
+    'first': lambda feasible, dv, dt: np.argmax(feasible, axis=1),
+    'best': lambda feasible, dv, dt: np.argmin(np.where(feasible, dv, np.inf), axis=1),
+}
+
+
+class FirstLegScan(NamedTuple):
+    offsets: np.ndarray # s
+    dv: np.ndarray # m/s, nan where nothing is reachable
+    dt: np.ndarray # s, nan where nothing is reachable
+    positions: np.ndarray # -1 where nothing is reachable
+
+
+class RouteScan(NamedTuple):
+    offsets: np.ndarray # s
+    caught: np.ndarray # objects caught after the start
+    dv: np.ndarray # m/s
+    time: np.ndarray # s, from the offset
+    routes: list[list[int]]
+
+
+def next_catches(
+        objects: Catalog,
+        current: int,
+        start: int,
+        per_catch_fuel_budget: float,
+        per_catch_time_target: float,
+        times: np.ndarray,
+        caught: np.ndarray | None,
+        choose: str,
+        index: CandidateIndex,
+        cache: catch.TransferCache
+        ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    collect_one from the object at position current for every lane at once
+
+    caught holds each lane's caught positions, padded with -1.
+    Returns the chosen positions (-1 if there is none), dv and dt per lane
+    """
+    positions = np.full(len(times), -1)
+    dv = np.full(len(times), np.nan)
+    dt = np.full(len(times), np.nan)
+    candidates = index.candidates(objects[current], start, per_catch_fuel_budget)
+    if not len(candidates):
+        return positions, dv, dt
+
+    chooser = ROW_CHOOSERS[choose]
+    invariants = cache.get(objects[current], candidates, per_catch_fuel_budget)
+    rows = max(1, CHUNK_CELLS // len(candidates))
+    for first in range(0, len(times), rows):
+        lanes = slice(first, first + rows)
+        lane_dv, lane_dt, valid = invariants.evaluate(times[lanes, np.newaxis])
+        feasible = valid & (lane_dt < per_catch_time_target)
+
+        if caught is not None:
+            # candidates are sorted, so each caught position has one place it could be
+            lane, slot = np.nonzero(caught[lanes] >= 0)
+            taken = caught[lanes][lane, slot]
+            column = np.minimum(np.searchsorted(candidates, taken), len(candidates) - 1)
+            hit = candidates[column] == taken
+            feasible[lane[hit], column[hit]] = False
+
+        choice = chooser(feasible, lane_dv, lane_dt)
+        row = np.arange(len(choice))
+        found = feasible[row, choice]
+        positions[lanes] = np.where(found, candidates[choice], -1)
+        dv[lanes] = np.where(found, lane_dv[row, choice], np.nan)
+        dt[lanes] = np.where(found, lane_dt[row, choice], np.nan)
+    return positions, dv, dt
+
+
+def scan_first_leg(
+        objects: Catalog,
+        start: int,
+        offsets: np.ndarray,
+        per_catch_fuel_budget: float,
+        per_catch_time_target: float,
+        choose: str = 'first',
+        index: CandidateIndex | None = None,
+        cache: catch.TransferCache | None = None
+        ) -> FirstLegScan:
+    """
+    The first catch from start, as collect_one would choose it at each offset
+    """
+    offsets = np.asarray(offsets, dtype=np.float64)
+    index = index if index is not None else CandidateIndex(objects)
+    cache = cache if cache is not None else catch.TransferCache(objects)
+    index.caught.clear()
+    positions, dv, dt = next_catches(objects, start, start, per_catch_fuel_budget, per_catch_time_target, offsets, None, choose, index, cache)
+    return FirstLegScan(offsets, dv, dt, positions)
+
+
+def scan_routes(
+        objects: Catalog,
+        start: int,
+        offsets: np.ndarray,
+        per_catch_fuel_budget: float,
+        per_catch_time_target: float,
+        total_fuel_budget: float,
+        choose: str = 'first',
+        index: CandidateIndex | None = None,
+        cache: catch.TransferCache | None = None
+        ) -> RouteScan:
+    """
+    The whole greedy collect route from start at each offset
+
+    Lane i matches collect(..., start_time=offsets[i]) with an index
+    """
+    offsets = np.asarray(offsets, dtype=np.float64)
+    index = index if index is not None else CandidateIndex(objects)
+    cache = cache if cache is not None else catch.TransferCache(objects)
+    # lanes keep their own caught positions, the index's set stays empty
+    index.caught.clear()
+
+    current = np.full(len(offsets), start)
+    times = offsets.copy()
+    v = np.zeros(len(offsets))
+    caught = np.full((len(offsets), 8), -1)
+    counts = np.zeros(len(offsets), dtype=np.int64)
+    active = np.ones(len(offsets), dtype=bool)
+
+    while True:
+        active &= v < total_fuel_budget
+        lanes = np.flatnonzero(active)
+        if not len(lanes):
+            break
+        if counts.max() == caught.shape[1]:
+            caught = np.concatenate([caught, np.full_like(caught, -1)], axis=1)
+
+        # split the lanes into groups at the same object
+        objects_at, inverse = np.unique(current[lanes], return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        groups = np.split(lanes[order], np.cumsum(np.bincount(inverse))[:-1])
+        for position, group in zip(objects_at, groups):
+            found, dv, dt = next_catches(
+                objects, int(position), start, per_catch_fuel_budget, per_catch_time_target,
+                times[group], caught[group], choose, index, cache)
+            stuck = found < 0
+            active[group[stuck]] = False
+            group, found, dv, dt = group[~stuck], found[~stuck], dv[~stuck], dt[~stuck]
+            v[group] += dv
+            times[group] += dt
+            caught[group, counts[group]] = found
+            counts[group] += 1
+            current[group] = found
+
+    routes = [caught[lane, :counts[lane]].tolist() for lane in range(len(offsets))]
+    return RouteScan(offsets, counts, v, times - offsets, routes)
+
+
+def best_windows(offsets: np.ndarray, order: np.ndarray, count: int = 5, separation: float = 0) -> list[int]:
+    """
+    The first count lanes of order whose offsets are at least separation apart,
+    so neighbouring offsets of one window are not all reported
+    """
+    chosen = []
+    for lane in order:
+        if all(abs(offsets[lane] - offsets[other]) >= separation for other in chosen):
+            chosen.append(int(lane))
+            if len(chosen) == count:
+                break
+    return chosen
+
+
+def main(
+        objects: Catalog,
+        start: int,
+        days: float,
+        step_hours: float,
+        per_catch_fuel_budget: float,
+        per_catch_time_target: float,
+        total_fuel_budget: float,
+        top: int = 10,
+        separation_days: float = 30):
+    offsets = np.arange(0, days * 86400, step_hours * 3600)
+    index = CandidateIndex(objects)
+    cache = catch.TransferCache(objects)
+
+    first = scan_first_leg(objects, start, offsets, per_catch_fuel_budget, per_catch_time_target, index=index, cache=cache)
+    reachable = first.positions >= 0
+    print(f'first leg reachable at {np.count_nonzero(reachable)} of {len(offsets)} offsets')
+    print('earliest first catches:')
+    # nan sorts last, so unreachable offsets never come first
+    for lane in best_windows(offsets, np.lexsort((first.dv, first.dt)), top, separation_days * 86400):
+        if reachable[lane]:
+            print(f'  day {offsets[lane]/86400:7.2f}: {first.positions[lane]:5}, {first.dv[lane]:3.0f} m/s, {first.dt[lane]/86400:6.1f} days')
+
+    routes = scan_routes(objects, start, offsets, per_catch_fuel_budget, per_catch_time_target, total_fuel_budget, index=index, cache=cache)
+    print(f'routes: {routes.caught.min()} to {routes.caught.max()} caught across offsets')
+    print('best launch windows:')
+    for lane in best_windows(offsets, np.lexsort((routes.time, routes.dv, -routes.caught)), top, separation_days * 86400):
+        print(f'  day {offsets[lane]/86400:7.2f}: {routes.caught[lane]:3} caught, {routes.dv[lane]:5.0f} m/s, {routes.time[lane]/60/60/24/365:5.2f} years')
@@ -0,0 +1,61 @@
+import get
+import mock_space_track
+
+
+def record(norad_cat_id: str, epoch: str, creation_date: str | None = None) -> dict:
+    result = {'NORAD_CAT_ID': norad_cat_id, 'OBJECT_TYPE': 'DEBRIS', 'MEAN_MOTION': '15.1', 'EPOCH': epoch}
+    if creation_date is not None:
+        result['CREATION_DATE'] = creation_date
+    return result
+
+
+def refresh(path: str, records: list[dict]) -> tuple[int, int]:
+    server = mock_space_track.serve(records)
+    try:
+        base_url = f'http://localhost:{server.server_address[1]}'
+        session = get.create_session(retries=0)
+        get.login(session, {'user': 'user', 'passcode': 'passcode'}, base_url)
+        return get.ingest(session, path, base_url=base_url, rate_limit=10_000)
+    finally:
+        server.shutdown()
+
+
+def test_late_record_is_fetched(tmp_path):
+    path = str(tmp_path / 'catalog.json.gz')
+    get.write_catalog({
+        '1': record('1', '2024-03-01T00:00:00', '2024-03-01T06:00:00'),
+        '2': record('2', '2024-01-10T00:00:00', '2024-01-10T06:00:00'),
+    }, path)
+    # published after the local catalog, with an EPOCH before its newest one
+    late = record('2', '2024-02-15T00:00:00', '2024-03-05T06:00:00')
+
+    changed, total = refresh(path, [record('1', '2024-03-01T00:00:00', '2024-03-01T06:00:00'), late])
+
+    assert (changed, total) == (1, 2)
+    assert get.read_catalog(path)['2'] == late
+
+
+def test_late_record_without_creation_date_is_fetched(tmp_path):
+    path = str(tmp_path / 'catalog.json.gz')
+    get.write_catalog({'1': record('1', '2024-03-01T00:00:00'), '2': record('2', '2024-01-10T00:00:00')}, path)
+    late = record('2', '2024-02-15T00:00:00')
+
+    assert get.cutoff(get.read_catalog(path))[0] == 'EPOCH'
+    changed, _ = refresh(path, [record('1', '2024-03-01T00:00:00'), late])
+
+    assert changed == 1
+    assert get.read_catalog(path)['2'] == late
+
+
+def test_unchanged_refresh_keeps_previous_catalog(tmp_path):
+    path = str(tmp_path / 'catalog.json.gz')
+    previous = str(tmp_path / 'catalog.previous.json.gz')
+    old = record('1', '2024-03-01T00:00:00', '2024-03-01T06:00:00')
+    new = record('1', '2024-03-02T00:00:00', '2024-03-02T06:00:00')
+    get.write_catalog({'1': old}, path)
+
+    assert refresh(path, [new]) == (1, 1)
+    assert refresh(path, [new]) == (0, 1)
+
+    assert get.read_catalog(previous) == {'1': old}
+    assert get.read_catalog(path) == {'1': new}